@@ -1,29 +1,1604 @@
 from __future__ import annotations
 
+import atexit
+import bisect
+import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import hmac
+import io
+import json
+import logging
+import math
+import multiprocessing
 import os
+import queue
+import random
+import re
+import smtplib
 import sqlite3
-from datetime import datetime
-from typing import Dict, List
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional, Sequence
 from functools import wraps
+from xml.sax.saxutils import escape as xml_escape
 
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; assets are then precompressed with gzip only
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the JSON API then uses the stdlib encoder
+    orjson = None
+
+import click
 from flask import (
     Flask,
+    before_render_template,
     abort,
     flash,
     g,
+    get_flashed_messages,
+    has_request_context,
+    jsonify,
+    make_response,
     redirect,
     render_template,
     request,
+    send_file,
     session,
+    stream_template,
+    stream_with_context,
+    template_rendered,
     url_for,
 )
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.bccache import Bucket
+from jinja2.ext import Extension
+
+
+class LRUCache:
+    """Thread-safe mapping bounded to ``maxsize`` entries, evicting least recently used."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class BufferedWriter:
+    """Write-behind queue that inserts rows in batched transactions.
+
+    ``submit`` appends the row to a per-process spool file and queues it; a
+    background thread commits queued rows with ``executemany`` and truncates
+    the spool once everything written to it is in the database. Spool files
+    left behind by a crashed process are replayed when a writer starts, so
+    accepted rows are delivered at least once. Capacity is bounded: when the
+    queue stays full for ``timeout`` seconds, ``submit`` returns False.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], sqlite3.Connection],
+        statement: str,
+        spool_dir: str,
+        maxsize: int,
+        batch_size: int,
+        flush_interval: float,
+        fsync: bool = True,
+    ):
+        self.name = name
+        self.connect = connect
+        self.statement = statement
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.maxsize = maxsize
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._pid = os.getpid()
+            self._queue: "queue.Queue[Sequence[Any]]" = queue.Queue()
+            self._slots = threading.BoundedSemaphore(self.maxsize)
+            # A fresh name per start: after a restart the PID may be the one a
+            # crashed process used, and its spool still has to be replayed.
+            self._spool_path = os.path.join(
+                self.spool_dir, f"{self.name}-{self._pid}-{os.urandom(4).hex()}.jsonl"
+            )
+            self._spool = open(self._spool_path, "a", encoding="utf-8")
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.name}-writer", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, row: Sequence[Any], timeout: float) -> bool:
+        if not self.running:
+            self.start()
+        if not self._slots.acquire(timeout=timeout):
+            self.rejected += 1
+            return False
+        with self._lock:
+            if self._spool.closed:
+                # The writer finished draining and removed its spool while stopping.
+                self._slots.release()
+                self.rejected += 1
+                return False
+            self._spool.write(json.dumps(list(row), ensure_ascii=False) + "\n")
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._queue.put_nowait(row)
+            self.accepted += 1
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self.running else 0
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything still queued and stop the background thread."""
+
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        connection = self.connect()
+        try:
+            self._replay_orphans(connection)
+            while not (self._stopping.is_set() and self._queue.empty()):
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(connection, batch)
+                for _ in batch:
+                    self._slots.release()
+                with self._lock:
+                    if self._queue.empty():
+                        self._spool.truncate(0)
+                        self._spool.seek(0)
+            with self._lock:
+                if self._queue.empty():
+                    self._spool.close()
+                    os.remove(self._spool_path)
+        finally:
+            connection.close()
+
+    def _write(self, connection: sqlite3.Connection, rows: List[Sequence[Any]]) -> None:
+        delay = 0.05
+        while True:
+            try:
+                with connection:
+                    connection.executemany(self.statement, rows)
+                self.written += len(rows)
+                return
+            except sqlite3.Error:
+                logging.getLogger(__name__).exception(
+                    "%s writer failed to store %d rows, retrying", self.name, len(rows)
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _replay_orphans(self, connection: sqlite3.Connection) -> None:
+        pattern = os.path.join(self.spool_dir, f"{self.name}-*.jsonl")
+        for path in glob.glob(pattern) + glob.glob(f"{pattern}.replay-*"):
+            if path == self._spool_path:
+                continue
+            # A spool being replayed is renamed with the replaying PID; when that
+            # process died mid-replay, the spool is taken over like any orphan.
+            if ".replay-" in os.path.basename(path):
+                spool, owner = path.rsplit(".replay-", 1)
+            else:
+                spool = path
+                owner = os.path.basename(path)[len(self.name) + 1 : -len(".jsonl")].split("-")[0]
+            if owner.isdigit() and int(owner) != self._pid and _process_alive(int(owner)):
+                continue
+            claimed = f"{spool}.replay-{self._pid}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed, encoding="utf-8") as spool:
+                rows = [json.loads(line) for line in spool if line.strip()]
+            if rows:
+                self._write(connection, rows)
+            os.remove(claimed)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """Durable background jobs kept in the ``jobs`` table.
+
+    ``enqueue`` inserts a row through the caller's connection, so a job
+    commits or rolls back together with the write that caused it. Identical
+    pending jobs collapse into one through a partial unique index on
+    ``dedup_key``. A dispatcher thread in each process claims due jobs with
+    a single ``UPDATE ... RETURNING`` and runs them on a bounded thread pool;
+    failures are retried with exponential backoff up to ``max_attempts``.
+    Running jobs are put back in the queue when their process died, when
+    this process (possibly a new one under a reused PID) is not running
+    them, or when they have held their claim longer than ``lease`` seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        workers: int,
+        poll_interval: float,
+        max_attempts: int,
+        backoff: float,
+        retention: float,
+        drain_timeout: float,
+        lease: float,
+        context: Callable[[], Any],
+    ):
+        self.connect = connect
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retention = retention
+        self.drain_timeout = drain_timeout
+        self.lease = lease
+        self.context = context
+        self.tasks: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.active = 0
+        # (seconds queued, seconds running) of recently finished jobs.
+        self.samples: "deque[tuple]" = deque(maxlen=1024)
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._claimed: set = set()
+
+    def task(self, name: str):
+        def decorator(func):
+            self.tasks[name] = func
+            return func
+
+        return decorator
+
+    @property
+    def running(self) -> bool:
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def enqueue(
+        self,
+        db: sqlite3.Connection,
+        task: str,
+        payload: Optional[Dict[str, Any]] = None,
+        delay: float = 0.0,
+    ) -> bool:
+        """Queue ``task``; return False when an identical job is already pending."""
+
+        if task not in self.tasks:
+            raise KeyError(f"Unknown task {task!r}")
+        body = json.dumps(payload or {}, sort_keys=True, ensure_ascii=False)
+        dedup_key = f"{task}:{hashlib.sha1(body.encode('utf-8')).hexdigest()}"
+        now = time.time()
+        added = db.execute(
+            "INSERT OR IGNORE INTO jobs (task, payload, dedup_key, run_at, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (task, body, dedup_key, now + delay, now),
+        ).rowcount
+        self._wake.set()
+        return bool(added)
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._slots = threading.BoundedSemaphore(self.workers)
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="job")
+            self._connection = self.connect()
+            self._connection.isolation_level = None
+            self._db_lock = threading.Lock()
+            self.active = 0
+            self._claimed = set()
+            self._thread = threading.Thread(target=self._run, name="job-dispatcher", daemon=True)
+            self._thread.start()
+        # At exit concurrent.futures stops accepting work before atexit hooks
+        # run; running jobs still finish and the dispatcher hands back any job
+        # it claims afterwards (see _release), then this drain joins it.
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming jobs and wait up to ``timeout`` for running ones to finish."""
+
+        if not self.running:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(self.drain_timeout if timeout is None else timeout)
+        # Jobs still running after the timeout stay claimed by this pid and
+        # are requeued by another process once this one has exited.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def depth(self, db: sqlite3.Connection) -> Dict[str, int]:
+        counts = {"pending": 0, "running": 0, "failed": 0}
+        rows = db.execute(
+            "SELECT state, COUNT(*) FROM jobs WHERE state IN ('pending', 'running', 'failed')"
+            " GROUP BY state"
+        )
+        counts.update({state: count for state, count in rows})
+        return counts
+
+    def latency(self) -> Dict[str, Optional[float]]:
+        samples = list(self.samples)
+        result: Dict[str, Optional[float]] = {}
+        for index, name in enumerate(("wait", "run")):
+            values = sorted(sample[index] for sample in samples)
+            for label, q in (("p50", 0.5), ("p95", 0.95)):
+                value = values[min(int(q * len(values)), len(values) - 1)] if values else None
+                result[f"{name}_{label}_ms"] = value and round(value * 1000, 2)
+        return result
+
+    def _run(self) -> None:
+        self._requeue_orphans()
+        next_purge = time.time() + 60
+        try:
+            while True:
+                if self._stopping.is_set():
+                    break
+                if not self._slots.acquire(timeout=self.poll_interval):
+                    continue
+                job = self._claim()
+                if job is None:
+                    self._slots.release()
+                    if time.time() >= next_purge:
+                        self._requeue_orphans()
+                        self._purge()
+                        next_purge = time.time() + 60
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                with self._lock:
+                    self.active += 1
+                    self._claimed.add(job["id"])
+                try:
+                    self._executor.submit(self._execute, job)
+                except RuntimeError:
+                    # The interpreter is shutting down: hand the job back.
+                    self._release(job)
+                    break
+            # Drain: wait for every slot to come back, i.e. running jobs to end.
+            for _ in range(self.workers):
+                self._slots.acquire()
+        finally:
+            with self._db_lock:
+                self._connection.close()
+
+    def _claim(self):
+        with self._db_lock:
+            try:
+                return self._connection.execute(
+                    "UPDATE jobs SET state = 'running', attempts = attempts + 1,"
+                    " started_at = ?, locked_by = ?"
+                    " WHERE id = (SELECT id FROM jobs WHERE state = 'pending' AND run_at <= ?"
+                    " ORDER BY run_at LIMIT 1)"
+                    " RETURNING id, task, payload, attempts, created_at, run_at",
+                    (time.time(), self._pid, time.time()),
+                ).fetchone()
+            except sqlite3.Error:
+                logging.getLogger(__name__).exception("Failed to claim a background job")
+                return None
+
+    def _execute(self, job) -> None:
+        started = time.time()
+        error = None
+        try:
+            with self.context():
+                self.tasks[job["task"]](json.loads(job["payload"]))
+        except Exception as exc:  # noqa: BLE001 - any task failure is retried
+            error = f"{type(exc).__name__}: {exc}"
+            logging.getLogger(__name__).warning(
+                "Job %s (%s) failed on attempt %s: %s",
+                job["id"],
+                job["task"],
+                job["attempts"],
+                error,
+            )
+        finished = time.time()
+        if error is None:
+            state, run_at = "done", job["run_at"]
+        elif job["attempts"] < self.max_attempts:
+            delay = self.backoff * 2 ** (job["attempts"] - 1)
+            state, run_at = "pending", finished + delay * random.uniform(0.8, 1.2)
+        else:
+            state, run_at = "failed", job["run_at"]
+        try:
+            with self._db_lock:
+                # OR REPLACE: a retry absorbs an identical job queued meanwhile.
+                self._connection.execute(
+                    "UPDATE OR REPLACE jobs SET state = ?, run_at = ?, finished_at = ?, error = ?,"
+                    " locked_by = NULL WHERE id = ?",
+                    (state, run_at, finished, error, job["id"]),
+                )
+        except sqlite3.Error:
+            logging.getLogger(__name__).exception("Failed to record job %s", job["id"])
+        with self._lock:
+            self.active -= 1
+            self._claimed.discard(job["id"])
+            if state == "done":
+                self.completed += 1
+                self.samples.append((started - job["created_at"], finished - started))
+            elif state == "pending":
+                self.retried += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def _release(self, job) -> None:
+        with self._db_lock:
+            self._connection.execute(
+                "UPDATE OR REPLACE jobs SET state = 'pending', attempts = attempts - 1,"
+                " locked_by = NULL WHERE id = ?",
+                (job["id"],),
+            )
+        with self._lock:
+            self.active -= 1
+            self._claimed.discard(job["id"])
+        self._slots.release()
+
+    def _requeue_orphans(self) -> None:
+        expired = time.time() - self.lease
+        with self._lock:
+            claimed = set(self._claimed)
+        with self._db_lock:
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, locked_by, started_at FROM jobs WHERE state = 'running'"
+                ).fetchall()
+                for job_id, owner, started_at in rows:
+                    if owner == self._pid:
+                        orphaned = job_id not in claimed
+                    else:
+                        orphaned = owner is None or not _process_alive(owner)
+                    if orphaned or (started_at or 0) < expired:
+                        self._connection.execute(
+                            "UPDATE OR REPLACE jobs SET state = 'pending', locked_by = NULL"
+                            " WHERE id = ? AND state = 'running'",
+                            (job_id,),
+                        )
+            except sqlite3.Error:
+                logging.getLogger(__name__).exception("Failed to requeue orphaned jobs")
+
+    def _purge(self) -> None:
+        with self._db_lock:
+            try:
+                self._connection.execute(
+                    "DELETE FROM jobs WHERE state = 'done' AND finished_at < ?",
+                    (time.time() - self.retention,),
+                )
+            except sqlite3.Error:
+                logging.getLogger(__name__).exception("Failed to purge finished jobs")
+
+
+def send_mail(
+    server: str, port: int, sender: str, recipients: Sequence[str], subject: str, body: str
+) -> None:
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(server, port, timeout=10) as smtp:
+        smtp.send_message(message)
+
+
+def hash_password(password: str, method: str) -> str:
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(stored: str, password: str, method: str):
+    """Check ``password`` against a stored hash or a legacy plaintext value.
+
+    Returns ``(valid, new_hash)``; ``new_hash`` is set when the password is
+    valid but stored in plaintext or with a method other than ``method``.
+    """
+
+    if stored.startswith(("scrypt:", "pbkdf2:")):
+        valid = check_password_hash(stored, password)
+        outdated = stored.split("$", 1)[0] != method
+    else:
+        valid = hmac.compare_digest(stored.encode("utf-8"), password.encode("utf-8"))
+        outdated = True
+    if valid and outdated:
+        return True, hash_password(password, method)
+    return valid, None
+
+
+class HasherBusy(RuntimeError):
+    """Raised when the password hashing pool is at capacity."""
+
+
+class PasswordHasher:
+    """Bounded process pool for key derivation.
+
+    At most ``max_pending`` calls may be queued or running at once; beyond
+    that ``run`` raises ``HasherBusy`` immediately, so a burst of logins is
+    shed at the login endpoint instead of tying up request threads; keep it
+    below the number of threads per server worker. Pool processes run with a
+    ``nice`` increment so page requests win the CPU. With ``workers`` set to
+    0 the work runs inline in the calling thread.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, nice: int = 0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.nice = nice
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._counter_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        with self._counter_lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy()
+            self.pending += 1
+        if not self.workers:
+            try:
+                return function(*args)
+            finally:
+                self._release()
+                self.completed += 1
+        try:
+            future = self._pool().submit(function, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the job finishes, even if the caller gave up.
+        future.add_done_callback(self._release)
+        try:
+            result = future.result(self.timeout)
+        except FutureTimeoutError:
+            self.rejected += 1
+            raise HasherBusy() from None
+        except BrokenProcessPool:
+            # A killed child poisons the executor; start a fresh one next time.
+            with self._lock:
+                self._executor = None
+            raise
+        self.completed += 1
+        return result
+
+    def _release(self, *_: Any) -> None:
+        with self._counter_lock:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # Spawned rather than forked: request workers are multi-threaded.
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=os.nice,
+                    initargs=(self.nice,),
+                )
+                self._pid = os.getpid()
+                atexit.register(self.shutdown)
+            return self._executor
+
+
+class RateLimiter:
+    """Token buckets kept in a small SQLite side database shared by all workers.
+
+    Each check is a single UPSERT that refills the bucket for the time passed,
+    takes a token when one is available and returns the outcome, so workers
+    never read-modify-write the same row. The same database holds write
+    leases: ``acquire`` inserts a lease only while fewer than ``capacity``
+    unexpired ones exist, so the cap holds across all workers, and a lease
+    left by a crashed worker lapses after ``lease`` seconds. The tables hold
+    throwaway state and are written with ``synchronous = OFF``. If the side
+    database cannot be used the request is allowed and ``errors`` is
+    incremented.
+    """
+
+    _statement = """
+        INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = MIN(:capacity, tokens + (:now - updated) * :rate)
+                - (MIN(:capacity, tokens + (:now - updated) * :rate) >= 1),
+            updated = :now,
+            allowed = MIN(:capacity, tokens + (:now - updated) * :rate) >= 1
+        RETURNING tokens, allowed
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.1, purge_every: int = 1000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.purge_every = purge_every
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._max_window = 0.0
+
+    def hit(self, key: str, capacity: int, per: float) -> float:
+        """Take a token from ``key``; return 0 when allowed, else seconds to wait."""
+
+        rate = capacity / per
+        now = time.time()
+        self._max_window = max(self._max_window, per)
+        try:
+            with self._lock:
+                connection = self._connect()
+                tokens, allowed = connection.execute(
+                    self._statement, {"key": key, "capacity": capacity, "rate": rate, "now": now}
+                ).fetchone()
+                if (self.allowed + self.rejected) % self.purge_every == 0:
+                    connection.execute(
+                        "DELETE FROM buckets WHERE updated < ?", (now - self._max_window,)
+                    )
+        except sqlite3.Error:
+            self.errors += 1
+            return 0.0
+        if allowed:
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return (1 - tokens) / rate
+
+    def acquire(self, capacity: int, lease: float) -> Optional[int]:
+        """Take one of ``capacity`` shared write leases; return its id, or None when full.
+
+        Returns 0 when the side database is unavailable, which ``release``
+        ignores.
+        """
+
+        now = time.time()
+        try:
+            with self._lock:
+                connection = self._connect()
+                row = connection.execute(
+                    "INSERT INTO leases (expires) SELECT :expires"
+                    " WHERE (SELECT COUNT(*) FROM leases WHERE expires >= :now) < :capacity"
+                    " RETURNING id",
+                    {"expires": now + lease, "now": now, "capacity": capacity},
+                ).fetchone()
+                if row is None:
+                    connection.execute("DELETE FROM leases WHERE expires < ?", (now,))
+        except sqlite3.Error:
+            self.errors += 1
+            return 0
+        return row[0] if row else None
+
+    def release(self, lease_id: int) -> None:
+        if not lease_id:
+            return
+        try:
+            with self._lock:
+                self._connect().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+        except sqlite3.Error:
+            # The lease lapses on its own.
+            self.errors += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+                " allowed INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS leases (id INTEGER PRIMARY KEY, expires REAL NOT NULL)"
+            )
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+
+class SuggestionIndex:
+    """Sorted-array prefix index for search-box suggestions.
+
+    Each suggestion is filed under its whole title and under every word
+    position, so "крыши" also finds "Зелёные крыши". Lookups bisect into an
+    immutable snapshot without locking; writers build a new snapshot under a
+    lock and swap it in. Every prefix match is ranked by weight, and the top
+    results per prefix are memoized with the snapshot, so the long scans of
+    one- and two-letter prefixes run once per snapshot. ``versions`` records
+    the change counters the snapshot reflects.
+    """
+
+    def __init__(self, memo_size: int = 256):
+        self.memo_size = memo_size
+        self.versions: Dict[str, Optional[int]] = {"news": None, "articles": None}
+        self.rebuilds = 0
+        self.updates = 0
+        self._lock = threading.Lock()
+        self._texts: Dict[Any, str] = {}
+        self._snapshot: tuple = ([], [], LRUCache(memo_size))
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.casefold().replace("ё", "е").split())
+
+    def _keys(self, text: str) -> List[str]:
+        words = self.normalize(text).split(" ")
+        return sorted({" ".join(words[i:]) for i in range(len(words)) if words[i]})
+
+    def replace_all(self, suggestions: Dict[Any, tuple], versions: Dict[str, int]) -> None:
+        """Swap in a complete set of ``(kind, ref) -> (text, weight)`` suggestions."""
+
+        pairs = sorted(
+            (key, (kind, ref, text, weight))
+            for (kind, ref), (text, weight) in suggestions.items()
+            for key in self._keys(text)
+        )
+        with self._lock:
+            self._texts = {ident: text for ident, (text, _) in suggestions.items()}
+            self._snapshot = (
+                [key for key, _ in pairs],
+                [entry for _, entry in pairs],
+                LRUCache(self.memo_size),
+            )
+            self.versions.update(versions)
+            self.rebuilds += 1
+
+    def advance(
+        self, counter: str, version: int, kind: str, ref: Any, text=None, weight: float = 0.0
+    ) -> bool:
+        """Apply a single put (``text`` given) or delete in place.
+
+        Only done when ``version`` directly follows the indexed one, i.e. the
+        change is the only write since the snapshot; otherwise the caller
+        leaves it to a full reload.
+        """
+
+        with self._lock:
+            known = self.versions.get(counter)
+            if known is None or version != known + 1:
+                return False
+            keys, entries = list(self._snapshot[0]), list(self._snapshot[1])
+            old_text = self._texts.pop((kind, ref), None)
+            if old_text is not None:
+                for key in self._keys(old_text):
+                    position = bisect.bisect_left(keys, key)
+                    while position < len(keys) and keys[position] == key:
+                        if entries[position][:2] == (kind, ref):
+                            del keys[position], entries[position]
+                            break
+                        position += 1
+            if text is not None:
+                self._texts[(kind, ref)] = text
+                for key in self._keys(text):
+                    position = bisect.bisect_left(keys, key)
+                    keys.insert(position, key)
+                    entries.insert(position, (kind, ref, text, weight))
+            self._snapshot = (keys, entries, LRUCache(self.memo_size))
+            self.versions[counter] = version
+            self.updates += 1
+            return True
+
+    def lookup(self, prefix: str, limit: int) -> List[tuple]:
+        keys, entries, memo = self._snapshot
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        result = memo.get((prefix, limit))
+        if result is not None:
+            return result
+        found: Dict[Any, tuple] = {}
+        start = bisect.bisect_left(keys, prefix)
+        for position in range(start, len(keys)):
+            if not keys[position].startswith(prefix):
+                break
+            kind, ref, text, weight = entries[position]
+            found.setdefault((kind, ref), (weight, text))
+        ranked = heapq.nsmallest(limit, found.items(), key=lambda item: (-item[1][0], item[1][1]))
+        result = [(kind, ref, text) for (kind, ref), (_, text) in ranked]
+        memo.set((prefix, limit), result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._snapshot[0])
+
+
+class SourceBytecodeCache(FileSystemBytecodeCache):
+    """On-disk Jinja bytecode cache keyed by template name and source hash.
+
+    Jinja keys entries by name alone, so old and new workers sharing the
+    directory during a rolling deploy would keep overwriting each other's
+    bytecode; here every template version gets its own file. Writes go to a
+    temporary file and are renamed into place, so concurrent workers are safe.
+    """
+
+    def get_bucket(self, environment, name, filename, source) -> Bucket:
+        checksum = self.get_source_checksum(source)
+        key = hashlib.sha1(f"{name}\0{filename}\0{checksum}".encode("utf-8")).hexdigest()
+        bucket = Bucket(environment, key, checksum)
+        self.load_bytecode(bucket)
+        return bucket
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, tag, ... %}...{% endcache %}`` keeps rendered fragments.
+
+    ``key`` names the fragment and every ``tag`` names a ``change_counters``
+    row it depends on. Entries are stored in ``environment.fragment_cache``
+    under the current versions of those counters, as returned by
+    ``environment.fragment_versions``, so a write only misses the fragments
+    tagged with the changed table. On a hit the block body is not run at all.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=LRUCache(0), fragment_versions=lambda tags: ())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render", [nodes.Tuple(args, "load")])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        cache = self.environment.fragment_cache
+        if not cache.maxsize:
+            return caller()
+        name, tags = args[0], args[1:]
+        key = (name, tags, self.environment.fragment_versions(tags))
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(key, fragment)
+        return fragment
+
+
+def minify_asset(path: str, source: str) -> str:
+    """Conservatively strip comments and whitespace from CSS and JavaScript."""
+
+    if path.endswith(".css"):
+        source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+        source = re.sub(r"\s+", " ", source)
+        source = re.sub(r"\s*([{};,])\s*", r"\1", source)
+        return re.sub(r":\s+", ":", source).strip()
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+
+
+def build_assets(static_folder: str, output_dir: str) -> Dict[str, str]:
+    """Write minified, content-hashed and precompressed copies of CSS/JS files.
+
+    Returns the manifest mapping ``css/style.css`` to ``css/style.<hash>.css``
+    and stores it as ``manifest.json`` in ``output_dir``. Files are written
+    atomically, so several workers may build at the same time.
+    """
+
+    manifest = {}
+    for source_path in sorted(glob.glob(os.path.join(static_folder, "**", "*.*"), recursive=True)):
+        if not source_path.endswith((".css", ".js")) or source_path.startswith(output_dir):
+            continue
+        relative = os.path.relpath(source_path, static_folder).replace(os.sep, "/")
+        with open(source_path, encoding="utf-8") as handle:
+            data = minify_asset(relative, handle.read()).encode("utf-8")
+        stem, extension = os.path.splitext(relative)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+        target = os.path.join(output_dir, hashed)
+        manifest[relative] = hashed
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _write_atomic(f"{target}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(f"{target}.br", brotli.compress(data))
+        _write_atomic(target, data)
+    os.makedirs(output_dir, exist_ok=True)
+    _write_atomic(
+        os.path.join(output_dir, "manifest.json"),
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"),
+    )
+    return manifest
+
 
+def compress_body(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
 
-def create_app() -> Flask:
+
+def compress_stream(chunks, encoding: str, level: int):
+    """Compress an iterable of chunks, flushing after each so nothing is held back."""
+
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        finish = compressor.finish
+
+        def compress(data: bytes) -> bytes:
+            return compressor.process(data) + compressor.flush()
+
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        finish = compressor.flush
+
+        def compress(data: bytes) -> bytes:
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def rechunk(fragments, size: int):
+    """Join Jinja's small template events into chunks of about ``size`` bytes."""
+
+    buffer: List[bytes] = []
+    buffered = 0
+    for fragment in fragments:
+        data = fragment.encode("utf-8")
+        buffer.append(data)
+        buffered += len(data)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def is_local_path(target: Optional[str]) -> bool:
+    """True for a path on this site, safe to redirect to after a form post."""
+
+    return (
+        bool(target)
+        and target.startswith("/")
+        and not target.startswith(("//", "/\\"))
+        and not any(ord(char) < 32 for char in target)
+    )
+
+
+def parse_news_cursor(cursor: Optional[str]):
+    """Split a ``<sort_date>_<id>`` news cursor; return None when it is malformed."""
+
+    if not cursor:
+        return None
+    sort_date, _, news_id = cursor.rpartition("_")
+    if not news_id.isdigit():
+        return None
+    return sort_date, int(news_id)
+
+
+def parse_fields(value: Optional[str], allowed: Sequence[str]) -> Optional[List[str]]:
+    """Parse a ``?fields=a,b`` selection; None means an unknown field was requested."""
+
+    if not value:
+        return list(allowed)
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    if not fields or any(name not in allowed for name in fields):
+        return None
+    return fields
+
+
+def dump_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def build_match_query(query: str, max_terms: int) -> str:
+    """Turn free text into a safe FTS5 MATCH expression (AND of quoted terms)."""
+
+    terms = re.findall(r"\w+", query.lower())[:max_terms]
+    return " ".join(f'"{term}"*' if len(term) >= 3 else f'"{term}"' for term in terms)
+
+
+def run_script(db: sqlite3.Connection, script: str) -> None:
+    """Execute a multi-statement SQL script inside the caller's transaction.
+
+    Unlike ``executescript`` this never issues an implicit COMMIT, so a
+    migration can be applied atomically under ``BEGIN EXCLUSIVE``.
+    """
+
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            db.execute(statement)
+            statement = ""
+    if statement.strip():
+        raise ValueError(f"Incomplete SQL statement: {statement.strip()[:80]}")
+
+
+def read_records(stream, fmt: str):
+    """Yield ``(line_number, record)`` pairs from a JSON Lines or CSV stream.
+
+    Records are parsed one at a time, so memory use does not grow with the
+    size of the file.
+    """
+
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_number, json.loads(line)
+
+
+def batched(items, size: int):
+    """Group an iterable into lists of at most ``size`` items."""
+
+    items = iter(items)
+    while True:
+        batch = [item for _, item in zip(range(size), items)]
+        if not batch:
+            return
+        yield batch
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that remembers when it was opened, for recycling."""
+
+    created_at = 0.0
+
+
+class InstrumentedConnection(PooledConnection):
+    """Pooled connection that adds statement counts and timings to the current request."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record_query(time.perf_counter() - started)
+
+
+def _record_query(seconds: float) -> None:
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_time += seconds
+
+
+class MetricsRegistry:
+    """Per-process request latency histograms and query totals by endpoint."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        endpoint: str,
+        seconds: float,
+        queries: int,
+        query_seconds: float,
+        render_seconds: float,
+    ) -> None:
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    "buckets": [0] * (len(self.buckets) + 1),
+                    "count": 0,
+                    "sum": 0.0,
+                    "queries": 0,
+                    "query_seconds": 0.0,
+                    "render_seconds": 0.0,
+                }
+            index = 0
+            while index < len(self.buckets) and seconds > self.buckets[index]:
+                index += 1
+            stats["buckets"][index] += 1
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["queries"] += queries
+            stats["query_seconds"] += query_seconds
+            stats["render_seconds"] += render_seconds
+
+    def quantile(self, stats: Dict[str, Any], q: float) -> float:
+        """Estimate a quantile from bucket counts, interpolating like histogram_quantile()."""
+
+        rank = q * stats["count"]
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, stats["buckets"]):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+    def render(self, extra: Dict[str, float]) -> str:
+        lines = ["# TYPE citygreenhub_request_duration_seconds histogram"]
+        with self._lock:
+            endpoints = {name: dict(stats) for name, stats in self._endpoints.items()}
+        for endpoint, stats in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, stats["buckets"]):
+                cumulative += count
+                lines.append(
+                    f'citygreenhub_request_duration_seconds_bucket{{endpoint="{endpoint}",'
+                    f'le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'citygreenhub_request_duration_seconds_bucket{{endpoint="{endpoint}",'
+                f'le="+Inf"}} {stats["count"]}'
+            )
+            lines.append(
+                f'citygreenhub_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["sum"]}'
+            )
+            lines.append(
+                f'citygreenhub_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["count"]}'
+            )
+        sections = [
+            ("citygreenhub_request_duration_quantile_seconds", "gauge", None),
+            ("citygreenhub_sql_queries_total", "counter", "queries"),
+            ("citygreenhub_sql_duration_seconds_total", "counter", "query_seconds"),
+            ("citygreenhub_render_duration_seconds_total", "counter", "render_seconds"),
+        ]
+        for metric, kind, field in sections:
+            lines.append(f"# TYPE {metric} {kind}")
+            for endpoint, stats in sorted(endpoints.items()):
+                if field is not None:
+                    lines.append(f'{metric}{{endpoint="{endpoint}"}} {stats[field]}')
+                    continue
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(
+                        f'{metric}{{endpoint="{endpoint}",quantile="{q}"}} '
+                        f"{self.quantile(stats, q):.6f}"
+                    )
+        for metric, value in sorted(extra.items()):
+            lines.append(f"# TYPE citygreenhub_{metric} gauge")
+            lines.append(f"citygreenhub_{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class ConnectionPool:
+    """Per-process pool of long-lived, tuned SQLite connections.
+
+    Idle connections are kept up to ``size``; extra connections are opened on
+    demand and closed on release. Connections are health-checked on checkout,
+    recycled after ``recycle`` seconds and dropped after a fork so workers
+    never share a connection with the gunicorn master.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        recycle: float,
+        pragmas: Dict[str, Any],
+        statement_cache: int = 128,
+        factory: type = PooledConnection,
+    ):
+        self.path = path
+        self.factory = factory
+        self.size = size
+        self.recycle = recycle
+        self.pragmas = pragmas
+        self.statement_cache = statement_cache
+        self._idle: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def connect(self) -> PooledConnection:
+        connection = sqlite3.connect(
+            self.path,
+            factory=self.factory,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+        )
+        connection.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value}")
+        connection.created_at = time.monotonic()
+        return connection
+
+    def acquire(self) -> PooledConnection:
+        if os.getpid() != self._pid:
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if self._is_healthy(connection):
+                return connection
+            connection.close()
+
+    def release(self, connection: PooledConnection) -> None:
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            connection.close()
+            return
+        if (
+            os.getpid() != self._pid
+            or self._expired(connection)
+            or self._idle.qsize() >= self.size
+        ):
+            connection.close()
+            return
+        self._idle.put(connection)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _expired(self, connection: PooledConnection) -> bool:
+        return time.monotonic() - connection.created_at > self.recycle
+
+    def _is_healthy(self, connection: PooledConnection) -> bool:
+        if self._expired(connection):
+            return False
+        try:
+            connection.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+
+def create_app(config_overrides: Optional[Dict[str, Any]] = None) -> Flask:
     app = Flask(__name__)
     app.config["SECRET_KEY"] = "change-me-in-production"
     os.makedirs(app.instance_path, exist_ok=True)
     app.config["DATABASE"] = os.path.join(app.instance_path, "citygreenhub.sqlite")
+    app.config["DB_POOL_SIZE"] = 8
+    app.config["DB_POOL_RECYCLE"] = 3600
+    app.config["DB_STATEMENT_CACHE"] = 256
+    app.config["DB_MIGRATE_ON_STARTUP"] = True
+    app.config["DB_PRAGMAS"] = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+    }
+    # Bulk imports: rows per executemany call, rows per transaction and the
+    # pragmas applied to the importing connection for the duration of the load.
+    app.config["IMPORT_BATCH_SIZE"] = 1000
+    app.config["IMPORT_COMMIT_ROWS"] = 20000
+    app.config["IMPORT_PRAGMAS"] = {
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "temp_store": "MEMORY",
+    }
+    app.config["NEWS_HOME_LIMIT"] = 5
+    app.config["NEWS_PAGE_SIZE"] = 20
+    app.config["NEWS_MAX_PAGE_SIZE"] = 100
+    app.config["IDENTITY_TRUSTED_ROLES"] = ("member",)
+    app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+    app.config["PASSWORD_POOL_WORKERS"] = 1
+    app.config["PASSWORD_POOL_MAX_PENDING"] = 2
+    app.config["PASSWORD_POOL_TIMEOUT"] = 5.0
+    app.config["PASSWORD_POOL_NICE"] = 5
+    app.config["RATE_LIMIT_ENABLED"] = True
+    app.config["RATE_LIMIT_DATABASE"] = os.path.join(app.instance_path, "ratelimit.sqlite")
+    # Buckets per endpoint: (requests, seconds) keyed by client IP and by submitted e-mail.
+    app.config["RATE_LIMITS"] = {
+        "contact": {"ip": (5, 300)},
+        "register": {"ip": (5, 3600), "account": (3, 3600)},
+        "login": {"ip": (30, 300), "account": (10, 300)},
+    }
+    # POSTs allowed to run at once across all workers (leases in the
+    # RATE_LIMIT_DATABASE); 0 disables the cap. WRITE_LEASE bounds how long a
+    # crashed worker's lease keeps a slot.
+    app.config["WRITE_CONCURRENCY"] = 8
+    app.config["WRITE_LEASE"] = 60.0
+    app.config["JOBS_ENABLED"] = True
+    app.config["JOBS_WORKERS"] = 2
+    app.config["JOBS_POLL_INTERVAL"] = 0.5
+    app.config["JOBS_MAX_ATTEMPTS"] = 5
+    app.config["JOBS_BACKOFF"] = 2.0
+    app.config["JOBS_RETENTION"] = 86400
+    app.config["JOBS_DRAIN_TIMEOUT"] = 10.0
+    # Seconds a claimed job may run before another dispatcher takes it over.
+    app.config["JOBS_LEASE"] = 600.0
+    # Regenerated shortly after news writes. Only documents cached on disk in
+    # FEEDS_DIR are worth warming: a page rendered by the job would only fill
+    # the in-memory caches of the process that ran it.
+    app.config["JOBS_WARM_PATHS"] = ("/feed.atom", "/sitemap.xml")
+    # Notifications are sent only when MAIL_SERVER is set.
+    app.config["MAIL_SERVER"] = None
+    app.config["MAIL_PORT"] = 25
+    app.config["MAIL_SENDER"] = "noreply@citygreenhub.example"
+    app.config["PAGE_CACHE_SIZE"] = 256
+    # Rendered {% cache %} blocks; 0 renders them every time.
+    app.config["FRAGMENT_CACHE_SIZE"] = 128
+    app.config["NEWS_CACHE_SIZE"] = 512
+    app.config["ARTICLE_BODY_CACHE_SIZE"] = 256
+    app.config["CONTACT_BUFFERED"] = False
+    app.config["CONTACT_QUEUE_SIZE"] = 1000
+    app.config["CONTACT_QUEUE_TIMEOUT"] = 0.5
+    app.config["CONTACT_BATCH_SIZE"] = 200
+    app.config["CONTACT_FLUSH_INTERVAL"] = 0.2
+    app.config["CONTACT_SPOOL_DIR"] = os.path.join(app.instance_path, "spool")
+    app.config["CONTACT_SPOOL_FSYNC"] = True
+    app.config["MESSAGES_PAGE_SIZE"] = 50
+    app.config["MESSAGES_EXPORT_CHUNK"] = 500
+    app.config["METRICS_ENABLED"] = False
+    app.config["METRICS_SERVER_TIMING"] = True
+    app.config["METRICS_BUCKETS"] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    app.config["ASSETS_DIR"] = os.path.join(app.static_folder, "dist")
+    app.config["ASSETS_BUILD_ON_STARTUP"] = True
+    app.config["ASSETS_MAX_AGE"] = 31536000
+    app.config["TEMPLATE_CACHE_DIR"] = os.path.join(app.instance_path, "jinja-cache")
+    app.config["TEMPLATE_WARMUP"] = False
+    app.config["TEMPLATE_WARMUP_PATHS"] = (
+        "/",
+        "/news",
+        "/about",
+        "/services",
+        "/articles",
+        "/practices",
+        "/resources",
+        "/contact",
+        "/login",
+        "/sitemap",
+    )
+    app.config["STREAM_TEMPLATES"] = False
+    app.config["STREAM_CHUNK_SIZE"] = 4096
+    app.config["COMPRESSION_ENABLED"] = False
+    app.config["COMPRESSION_MIN_SIZE"] = 1024
+    app.config["COMPRESSION_LEVEL"] = {"gzip": 6, "br": 4}
+    app.config["COMPRESSION_MIMETYPES"] = {
+        "text/html",
+        "text/plain",
+        "text/csv",
+        "application/json",
+        "application/x-ndjson",
+        "application/atom+xml",
+        "application/xml",
+    }
+    app.config["SEARCH_PER_PAGE"] = 10
+    app.config["SEARCH_MAX_PAGE"] = 20
+    app.config["SEARCH_MAX_QUERY_LENGTH"] = 200
+    app.config["SEARCH_MAX_TERMS"] = 8
+    app.config["SEARCH_MAX_VM_STEPS"] = 2_000_000
+    app.config["SUGGEST_LIMIT"] = 8
+    app.config["SUGGEST_NEWS_LIMIT"] = 5000
+    app.config["SUGGEST_TERMS"] = 500
+    app.config["SUGGEST_REFRESH_INTERVAL"] = 2.0
+    app.config["API_MAX_AGE"] = 30
+    app.config["API_SHARED_MAX_AGE"] = 60
+    app.config["API_STALE_WHILE_REVALIDATE"] = 300
+    app.config["FEEDS_DIR"] = os.path.join(app.instance_path, "feeds")
+    # Scheme and host of absolute links in feeds, sitemaps and e-mails. The
+    # request's Host header is client-controlled, so it is never used there.
+    app.config["SITE_URL"] = "http://localhost:8000"
+    app.config["FEED_SIZE"] = 50
+    app.config["FEED_MAX_AGE"] = 300
+    app.config["SITEMAP_CHUNK_SIZE"] = 10000
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    # Must be set before anything touches app.jinja_env, which is created once.
+    app.jinja_options = {
+        **app.jinja_options,
+        "extensions": [*app.jinja_options.get("extensions", ()), FragmentCacheExtension],
+    }
+    if app.config["TEMPLATE_CACHE_DIR"]:
+        os.makedirs(app.config["TEMPLATE_CACHE_DIR"], exist_ok=True)
+        app.jinja_options = {
+            **app.jinja_options,
+            "bytecode_cache": SourceBytecodeCache(app.config["TEMPLATE_CACHE_DIR"]),
+        }
+
+    contact_writer = None
+    if app.config["CONTACT_BUFFERED"]:
+        contact_writer = BufferedWriter(
+            "contact",
+            connect=lambda: db_pool.connect(),
+            statement="INSERT INTO messages (name, email, message, created) VALUES (?, ?, ?, ?)",
+            spool_dir=app.config["CONTACT_SPOOL_DIR"],
+            maxsize=app.config["CONTACT_QUEUE_SIZE"],
+            batch_size=app.config["CONTACT_BATCH_SIZE"],
+            flush_interval=app.config["CONTACT_FLUSH_INTERVAL"],
+            fsync=app.config["CONTACT_SPOOL_FSYNC"],
+        )
+
+        @app.before_request
+        def start_contact_writer():
+            # Started from a request rather than create_app() so the thread
+            # lives in the serving worker, not in a preloading master process.
+            if not contact_writer.running:
+                contact_writer.start()
+
+    password_hasher = PasswordHasher(
+        app.config["PASSWORD_POOL_WORKERS"],
+        app.config["PASSWORD_POOL_MAX_PENDING"],
+        app.config["PASSWORD_POOL_TIMEOUT"],
+        app.config["PASSWORD_POOL_NICE"],
+    )
+    suggestions = SuggestionIndex()
+    suggest_refresher: Dict[str, Any] = {"thread": None, "pid": None}
+    suggest_refresher_lock = threading.Lock()
+
+    job_queue = None
+    if app.config["JOBS_ENABLED"]:
+        job_queue = JobQueue(
+            connect=lambda: db_pool.connect(),
+            workers=app.config["JOBS_WORKERS"],
+            poll_interval=app.config["JOBS_POLL_INTERVAL"],
+            max_attempts=app.config["JOBS_MAX_ATTEMPTS"],
+            backoff=app.config["JOBS_BACKOFF"],
+            retention=app.config["JOBS_RETENTION"],
+            drain_timeout=app.config["JOBS_DRAIN_TIMEOUT"],
+            lease=app.config["JOBS_LEASE"],
+            context=app.app_context,
+        )
+
+        @app.before_request
+        def start_job_queue():
+            # Like the contact writer: started in the serving process only.
+            if not job_queue.running:
+                job_queue.start()
+
+    rate_limiter = RateLimiter(app.config["RATE_LIMIT_DATABASE"])
+    write_admission = {"active": 0, "rejected": 0}
+    write_admission_lock = threading.Lock()
+    # Verified instead of a real hash for unknown e-mails, so they take as long.
+    # Derived once at startup (in the master under preload_app), never on a
+    # request thread.
+    decoy_password_hash = hash_password(os.urandom(16).hex(), app.config["PASSWORD_HASH_METHOD"])
+
+    assets_dir = app.config["ASSETS_DIR"]
+    feeds_dir = app.config["FEEDS_DIR"]
+    asset_manifest: Dict[str, str] = {}
+    if app.config["ASSETS_BUILD_ON_STARTUP"]:
+        asset_manifest = build_assets(app.static_folder, assets_dir)
+    elif os.path.exists(os.path.join(assets_dir, "manifest.json")):
+        with open(os.path.join(assets_dir, "manifest.json"), encoding="utf-8") as handle:
+            asset_manifest = json.load(handle)
+
+    page_cache = LRUCache(app.config["PAGE_CACHE_SIZE"])
+    news_cache = LRUCache(app.config["NEWS_CACHE_SIZE"])
+    news_cache_state = {"version": None, "reloads": 0}
+    news_cache_lock = threading.Lock()
+    article_bodies = LRUCache(app.config["ARTICLE_BODY_CACHE_SIZE"])
+    article_store = {"version": None, "sections": {}, "by_slug": {}, "listing": []}
+    article_store_lock = threading.Lock()
+    revoked_state: Dict[str, Any] = {"version": None, "emails": {}}
+    revoked_state_lock = threading.Lock()
+
+    db_pool = ConnectionPool(
+        app.config["DATABASE"],
+        size=app.config["DB_POOL_SIZE"],
+        recycle=app.config["DB_POOL_RECYCLE"],
+        pragmas=app.config["DB_PRAGMAS"],
+        statement_cache=app.config["DB_STATEMENT_CACHE"],
+        factory=InstrumentedConnection if app.config["METRICS_ENABLED"] else PooledConnection,
+    )
 
     site_meta = {
         "title": "City Green Hub",
@@ -42,7 +1617,7 @@ def create_app() -> Flask:
         ),
     }
 
-    article_sections: Dict[str, List[Dict[str, str]]] = {
+    seed_article_sections: Dict[str, List[Dict[str, str]]] = {
         "Аналитика": [
             {
                 "slug": "зелёные-крыши",
@@ -234,20 +1809,24 @@ def create_app() -> Flask:
 
     def get_db():
         if "db" not in g:
-            connection = sqlite3.connect(app.config["DATABASE"])
-            connection.row_factory = sqlite3.Row
-            g.db = connection
+            if db_pool.size > 0:
+                g.db = db_pool.acquire()
+            else:
+                connection = sqlite3.connect(app.config["DATABASE"], factory=db_pool.factory)
+                connection.row_factory = sqlite3.Row
+                g.db = connection
         return g.db
 
-    def init_db():
-        db = get_db()
-        db.executescript(
+    def migrate_base_schema(db):
+        run_script(
+            db,
             """
             CREATE TABLE IF NOT EXISTS users (
                 email TEXT PRIMARY KEY,
                 password TEXT NOT NULL,
                 role TEXT NOT NULL,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                auth_version INTEGER NOT NULL DEFAULT 0
             );
 
             CREATE TABLE IF NOT EXISTS news (
@@ -255,7 +1834,8 @@ def create_app() -> Flask:
                 title TEXT NOT NULL,
                 date TEXT NOT NULL,
                 summary TEXT NOT NULL,
-                author TEXT NOT NULL
+                author TEXT NOT NULL,
+                sort_date TEXT GENERATED ALWAYS AS (COALESCE(date(date), '')) VIRTUAL
             );
 
             CREATE TABLE IF NOT EXISTS messages (
@@ -265,9 +1845,189 @@ def create_app() -> Flask:
                 message TEXT NOT NULL,
                 created TEXT NOT NULL
             );
+            """,
+        )
+
+    def migrate_messages_inbox(db):
+        message_columns = {row["name"] for row in db.execute("PRAGMA table_info(messages)")}
+        if "archived" not in message_columns:
+            db.execute("ALTER TABLE messages ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        run_script(
+            db,
+            """
+            CREATE INDEX IF NOT EXISTS messages_inbox ON messages (archived, id);
+            DROP INDEX IF EXISTS messages_by_email;
+            CREATE INDEX IF NOT EXISTS messages_by_sender
+                ON messages (email COLLATE NOCASE, archived, id);
+            CREATE INDEX IF NOT EXISTS messages_by_created ON messages (created);
+            """,
+        )
+
+    def migrate_auth_version(db):
+        user_columns = {row["name"] for row in db.execute("PRAGMA table_info(users)")}
+        if "auth_version" not in user_columns:
+            db.execute("ALTER TABLE users ADD COLUMN auth_version INTEGER NOT NULL DEFAULT 0")
+
+    def migrate_news_feed(db):
+        news_columns = {row["name"] for row in db.execute("PRAGMA table_xinfo(news)")}
+        if "sort_date" not in news_columns:
+            db.execute(
+                "ALTER TABLE news ADD COLUMN sort_date TEXT"
+                " GENERATED ALWAYS AS (COALESCE(date(date), '')) VIRTUAL"
+            )
+        db.execute("CREATE INDEX IF NOT EXISTS news_feed ON news (sort_date DESC, id DESC)")
+
+    def migrate_search_index(db):
+        search_index_exists = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        ).fetchone()
+        run_script(
+            db,
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                kind UNINDEXED,
+                ref UNINDEXED,
+                section UNINDEXED,
+                title,
+                body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '3 4'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS news_search_insert AFTER INSERT ON news BEGIN
+                INSERT INTO search_index (rowid, kind, ref, section, title, body)
+                VALUES (new.id, 'news', new.id, 'Новости', new.title, new.summary);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS news_search_update AFTER UPDATE ON news BEGIN
+                DELETE FROM search_index WHERE rowid = old.id;
+                INSERT INTO search_index (rowid, kind, ref, section, title, body)
+                VALUES (new.id, 'news', new.id, 'Новости', new.title, new.summary);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS news_search_delete AFTER DELETE ON news BEGIN
+                DELETE FROM search_index WHERE rowid = old.id;
+            END;
+            """,
+        )
+        if not search_index_exists:
+            db.execute(
+                "INSERT INTO search_index (rowid, kind, ref, section, title, body)"
+                " SELECT id, 'news', id, 'Новости', title, summary FROM news"
+            )
+
+    def migrate_change_counters(db):
+        run_script(
+            db,
+            """
+            CREATE TABLE IF NOT EXISTS change_counters (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                changed_at TEXT NOT NULL
+            ) WITHOUT ROWID;
+
+            INSERT OR IGNORE INTO change_counters (name, version, changed_at)
+            VALUES ('news', 0, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+
+            CREATE TRIGGER IF NOT EXISTS news_counter_insert AFTER INSERT ON news BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'news';
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS news_counter_update AFTER UPDATE ON news BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'news';
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS news_counter_delete AFTER DELETE ON news BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'news';
+            END;
+            """,
+        )
+
+    def migrate_articles(db):
+        articles_exist = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles'"
+        ).fetchone()
+        run_script(
+            db,
             """
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                slug TEXT NOT NULL UNIQUE,
+                section TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                excerpt TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS articles_listing ON articles (position, id);
+
+            CREATE TRIGGER IF NOT EXISTS articles_search_insert AFTER INSERT ON articles BEGIN
+                INSERT INTO search_index (rowid, kind, ref, section, title, body)
+                VALUES (-new.id, 'article', new.slug, new.section, new.title,
+                        new.excerpt || ' ' || new.content);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS articles_search_update AFTER UPDATE ON articles BEGIN
+                DELETE FROM search_index WHERE rowid = -old.id;
+                INSERT INTO search_index (rowid, kind, ref, section, title, body)
+                VALUES (-new.id, 'article', new.slug, new.section, new.title,
+                        new.excerpt || ' ' || new.content);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS articles_search_delete AFTER DELETE ON articles BEGIN
+                DELETE FROM search_index WHERE rowid = -old.id;
+            END;
+
+            INSERT OR IGNORE INTO change_counters (name, version, changed_at)
+            VALUES ('articles', 0, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+
+            CREATE TRIGGER IF NOT EXISTS articles_counter_insert AFTER INSERT ON articles BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'articles';
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS articles_counter_update AFTER UPDATE ON articles BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'articles';
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS articles_counter_delete AFTER DELETE ON articles BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'articles';
+            END;
+            """,
         )
+        if not articles_exist:
+            # Earlier versions indexed the in-memory articles under negative rowids.
+            db.execute("DELETE FROM search_index WHERE rowid < 0")
+            position = 0
+            for group_name, group in seed_article_sections.items():
+                for article in group:
+                    position += 1
+                    db.execute(
+                        "INSERT INTO articles (slug, section, position, title, excerpt, content)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            article["slug"],
+                            group_name,
+                            position,
+                            article["title"],
+                            article["excerpt"],
+                            article["content"],
+                        ),
+                    )
 
+    def migrate_seed_data(db):
         existing_users = {
             row["email"] for row in db.execute("SELECT email FROM users").fetchall()
         }
@@ -277,7 +2037,7 @@ def create_app() -> Flask:
                     "INSERT INTO users (email, password, role, created_at) VALUES (?, ?, ?, ?)",
                     (
                         seed["email"],
-                        seed["password"],
+                        hash_password(seed["password"], app.config["PASSWORD_HASH_METHOD"]),
                         seed["role"],
                         datetime.utcnow().isoformat(),
                     ),
@@ -285,12 +2045,158 @@ def create_app() -> Flask:
 
         has_news = db.execute("SELECT COUNT(*) as c FROM news").fetchone()["c"]
         if has_news == 0:
-            for item in seed_news:
-                db.execute(
-                    "INSERT INTO news (title, date, summary, author) VALUES (?, ?, ?, ?)",
-                    (item["title"], item["date"], item["summary"], item["author"]),
-                )
-        db.commit()
+            db.executemany(
+                "INSERT INTO news (title, date, summary, author)"
+                " VALUES (:title, :date, :summary, :author)",
+                seed_news,
+            )
+
+    def migrate_news_external_id(db):
+        news_columns = {row["name"] for row in db.execute("PRAGMA table_xinfo(news)")}
+        if "external_id" not in news_columns:
+            db.execute("ALTER TABLE news ADD COLUMN external_id TEXT")
+        db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS news_by_external_id ON news (external_id)"
+        )
+
+    def migrate_news_editing(db):
+        news_columns = {row["name"] for row in db.execute("PRAGMA table_xinfo(news)")}
+        if "version" not in news_columns:
+            db.execute("ALTER TABLE news ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        run_script(
+            db,
+            """
+            CREATE INDEX IF NOT EXISTS news_by_author ON news (author, sort_date DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS news_by_title ON news (title COLLATE NOCASE);
+            """,
+        )
+
+    def migrate_messages_by_day(db):
+        # Replaces messages_by_created, which no inbox query could use: the
+        # inbox always narrows by archived first.
+        run_script(
+            db,
+            """
+            DROP INDEX IF EXISTS messages_by_created;
+            CREATE INDEX IF NOT EXISTS messages_by_day ON messages (archived, created, id);
+            """,
+        )
+
+    def migrate_news_title_folded(db):
+        news_columns = {row["name"] for row in db.execute("PRAGMA table_xinfo(news)")}
+        if "title_folded" not in news_columns:
+            db.execute("ALTER TABLE news ADD COLUMN title_folded TEXT")
+        # str.casefold has no SQL counterpart, so the application fills the
+        # column on every write and the backfill runs in Python.
+        db.executemany(
+            "UPDATE news SET title_folded = ? WHERE id = ?",
+            [
+                (row["title"].casefold(), row["id"])
+                for row in db.execute(
+                    "SELECT id, title FROM news WHERE title_folded IS NULL"
+                ).fetchall()
+            ],
+        )
+        run_script(
+            db,
+            """
+            DROP INDEX IF EXISTS news_by_title;
+            CREATE INDEX IF NOT EXISTS news_by_title ON news (title_folded);
+            """,
+        )
+
+    def migrate_jobs(db):
+        run_script(
+            db,
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                locked_by INTEGER,
+                error TEXT
+            );
+
+            CREATE UNIQUE INDEX IF NOT EXISTS jobs_pending_dedup
+                ON jobs (dedup_key) WHERE state = 'pending';
+            CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, run_at);
+            """,
+        )
+
+    def migrate_users_counter(db):
+        # Only revocations move this counter, so sign-ups and rehashes on login
+        # do not invalidate the per-process copy of revoked auth versions.
+        run_script(
+            db,
+            """
+            INSERT OR IGNORE INTO change_counters (name, version, changed_at)
+            VALUES ('users', 0, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+
+            CREATE TRIGGER IF NOT EXISTS users_counter_update
+            AFTER UPDATE OF auth_version ON users BEGIN
+                UPDATE change_counters
+                SET version = version + 1, changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+                WHERE name = 'users';
+            END;
+            """,
+        )
+
+    # Append new steps at the end; PRAGMA user_version records how many have run.
+    # Steps up to the seed data predate versioning and stay idempotent because
+    # existing databases start from version 0.
+    migrations = [
+        migrate_base_schema,
+        migrate_messages_inbox,
+        migrate_auth_version,
+        migrate_news_feed,
+        migrate_search_index,
+        migrate_change_counters,
+        migrate_articles,
+        migrate_seed_data,
+        migrate_news_external_id,
+        migrate_news_editing,
+        migrate_jobs,
+        migrate_users_counter,
+        migrate_news_title_folded,
+        migrate_messages_by_day,
+    ]
+
+    def init_db() -> int:
+        """Apply pending migrations and return the schema version.
+
+        Uses its own short-lived connection so a preloading gunicorn master
+        does not leave pooled connections behind for forked workers.
+        """
+
+        db = db_pool.connect()
+        db.isolation_level = None
+        try:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(migrations):
+                return version
+            db.execute("BEGIN EXCLUSIVE")
+            try:
+                # Another process may have migrated while we waited for the lock.
+                version = db.execute("PRAGMA user_version").fetchone()[0]
+                for migration in migrations[version:]:
+                    migration(db)
+                version = max(version, len(migrations))
+                db.execute(f"PRAGMA user_version = {version}")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            app.logger.info("Database schema migrated to version %s", version)
+            return version
+        finally:
+            db.close()
 
     @app.cli.command("reset-db")
     def reset_db_command():
@@ -300,44 +2206,780 @@ def create_app() -> Flask:
         existing_conn = g.pop("db", None)
         if existing_conn:
             existing_conn.close()
+        db_pool.close_all()
 
-        if db_path and os.path.exists(db_path):
-            os.remove(db_path)
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if path and os.path.exists(path):
+                os.remove(path)
 
         init_db()
         print(f"Database reset and seeded at {db_path}.")
 
+    @app.cli.command("migrate")
+    def migrate_command():
+        """Apply pending schema migrations."""
+
+        version = init_db()
+        print(f"Database schema is at version {version} of {len(migrations)}.")
+
+    @app.cli.command("seed-bench")
+    @click.option("--news", "news_count", default=100_000, show_default=True)
+    @click.option("--messages", "message_count", default=1_000_000, show_default=True)
+    @click.option("--users", "user_count", default=100_000, show_default=True)
+    @click.option("--batch", "batch_size", default=10_000, show_default=True)
+    def seed_bench_command(news_count: int, message_count: int, user_count: int, batch_size: int):
+        """Add synthetic news, messages and users for load testing."""
+
+        words = (
+            "город парк двор дерево крыша сад вода сток почва климат шум воздух"
+            " жители проект грант мониторинг полив кустарник река берег"
+        ).split()
+        start = datetime(2015, 1, 1)
+
+        def news_rows():
+            for i in range(news_count):
+                title = " ".join(words[(i * k) % len(words)] for k in (1, 3, 7)).capitalize()
+                yield (
+                    f"{title} №{i}",
+                    f"{title} №{i}".casefold(),
+                    (start + timedelta(hours=i)).strftime("%Y-%m-%d"),
+                    " ".join(words[(i + k) % len(words)] for k in range(12)),
+                    seed_users[i % len(seed_users)]["email"],
+                )
+
+        def message_rows():
+            for i in range(message_count):
+                yield (
+                    f"Посетитель {i}",
+                    f"visitor{i % 5000}@bench.example",
+                    " ".join(words[(i + k) % len(words)] for k in range(20)),
+                    (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M UTC"),
+                )
+
+        def user_rows():
+            created = datetime.utcnow().isoformat()
+            # One shared hash: hashing every synthetic user would take minutes.
+            bench_hash = hash_password("benchpass", app.config["PASSWORD_HASH_METHOD"])
+            for i in range(user_count):
+                yield (f"bench-user-{i}@bench.example", bench_hash, "member", created)
+
+        db = get_db()
+        jobs = [
+            (
+                "news",
+                "INSERT INTO news (title, title_folded, date, summary, author)"
+                " VALUES (?, ?, ?, ?, ?)",
+                news_rows(),
+            ),
+            (
+                "messages",
+                "INSERT INTO messages (name, email, message, created) VALUES (?, ?, ?, ?)",
+                message_rows(),
+            ),
+            (
+                "users",
+                "INSERT OR IGNORE INTO users (email, password, role, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                user_rows(),
+            ),
+        ]
+        for table, statement, rows in jobs:
+            started = time.perf_counter()
+            total = 0
+            while True:
+                chunk = [row for _, row in zip(range(batch_size), rows)]
+                if not chunk:
+                    break
+                with db:
+                    db.executemany(statement, chunk)
+                total += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"{table}: {total} rows in {elapsed:.1f}s")
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Write fingerprinted, minified and precompressed static assets."""
+
+        manifest = build_assets(app.static_folder, assets_dir)
+        for source, hashed in sorted(manifest.items()):
+            print(f"{source} -> {hashed}")
+        if brotli is None:
+            print("brotli is not installed; only gzip variants were written.")
+
+    @app.cli.command("set-role")
+    @click.argument("email")
+    @click.argument("role", type=click.Choice(["admin", "editor", "member"]))
+    def set_role_command(email: str, role: str):
+        """Change a user's role and sign out their existing sessions."""
+
+        db = get_db()
+        if not db.execute("UPDATE users SET role = ? WHERE email = ?", (role, email)).rowcount:
+            raise click.ClickException(f"User {email} not found.")
+        invalidate_identity(db, email)
+        db.commit()
+        print(f"{email} is now {role}.")
+
+    @app.cli.command("set-password")
+    @click.argument("email")
+    @click.password_option()
+    def set_password_command(email: str, password: str):
+        """Change a user's password and sign out their existing sessions."""
+
+        db = get_db()
+        password_hash = hash_password(password, app.config["PASSWORD_HASH_METHOD"])
+        updated = db.execute(
+            "UPDATE users SET password = ? WHERE email = ?", (password_hash, email)
+        ).rowcount
+        if not updated:
+            raise click.ClickException(f"User {email} not found.")
+        invalidate_identity(db, email)
+        db.commit()
+        print(f"Password for {email} updated.")
+
+    @app.cli.command("import-articles")
+    @click.argument("source", type=click.File("r", encoding="utf-8"))
+    def import_articles_command(source):
+        """Create or update articles from a JSON Lines file, matched by slug.
+
+        Running workers pick the changes up on their next request.
+        """
+
+        db = get_db()
+        count = 0
+        for line in source:
+            if not line.strip():
+                continue
+            article = json.loads(line)
+            db.execute(
+                """
+                INSERT INTO articles (slug, section, position, title, excerpt, content)
+                VALUES (
+                    :slug, :section,
+                    COALESCE(:position, (SELECT COALESCE(MAX(position), 0) + 1 FROM articles)),
+                    :title, :excerpt, :content
+                )
+                ON CONFLICT (slug) DO UPDATE SET
+                    section = excluded.section,
+                    position = COALESCE(:position, articles.position),
+                    title = excluded.title,
+                    excerpt = excluded.excerpt,
+                    content = excluded.content
+                """,
+                {"position": None, **article},
+            )
+            count += 1
+        db.commit()
+        print(f"Imported {count} articles.")
+
+    news_export_fields = ("id", "external_id", "title", "date", "summary", "author")
+
+    @app.cli.command("import-news")
+    @click.argument("source", type=click.File("r", encoding="utf-8-sig"))
+    @click.option("--format", "fmt", type=click.Choice(["auto", "jsonl", "csv"]), default="auto")
+    @click.option("--author", default=None, help="Author for records that have none.")
+    @click.option("--batch", "batch_size", type=int, default=None, help="Rows per executemany.")
+    @click.option("--commit-every", type=int, default=None, help="Rows per transaction.")
+    @click.option(
+        "--defer-indexes",
+        is_flag=True,
+        help="Drop news indexes and triggers during the load and rebuild them afterwards.",
+    )
+    def import_news_command(source, fmt, author, batch_size, commit_every, defer_indexes):
+        """Create or update news from a JSON Lines or CSV file.
+
+        Records with an ``external_id`` are upserted, so re-running an import
+        is idempotent; records without one are always inserted. Use
+        ``--defer-indexes`` only while nothing else writes to the database.
+        """
+
+        if fmt == "auto":
+            fmt = "csv" if getattr(source, "name", "").endswith(".csv") else "jsonl"
+        batch_size = batch_size or app.config["IMPORT_BATCH_SIZE"]
+        commit_every = max(commit_every or app.config["IMPORT_COMMIT_ROWS"], batch_size)
+
+        def rows():
+            for line_number, record in read_records(source, fmt):
+                row = {
+                    "external_id": record.get("external_id") or None,
+                    "title": (record.get("title") or "").strip(),
+                    "date": (record.get("date") or "").strip(),
+                    "summary": (record.get("summary") or "").strip(),
+                    "author": (record.get("author") or author or "").strip(),
+                }
+                missing = [name for name, value in row.items() if not value]
+                missing = [name for name in missing if name != "external_id"]
+                if missing:
+                    raise click.ClickException(
+                        f"Line {line_number}: missing {', '.join(missing)}."
+                    )
+                if row["external_id"] is not None:
+                    row["external_id"] = str(row["external_id"])
+                row["title_folded"] = row["title"].casefold()
+                yield row
+
+        db = get_db()
+        saved_pragmas = {
+            name: db.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in app.config["IMPORT_PRAGMAS"]
+        }
+        for name, value in app.config["IMPORT_PRAGMAS"].items():
+            db.execute(f"PRAGMA {name} = {value}")
+        deferred = []
+        if defer_indexes:
+            deferred = db.execute(
+                "SELECT type, name, sql FROM sqlite_master"
+                " WHERE tbl_name = 'news' AND type IN ('index', 'trigger')"
+                " AND sql IS NOT NULL AND name != 'news_by_external_id'"
+            ).fetchall()
+            for row in deferred:
+                db.execute(f"DROP {row['type'].upper()} {row['name']}")
+            db.commit()
+
+        started = time.perf_counter()
+        processed = written = 0
+        try:
+            pending = 0
+            for chunk in batched(rows(), batch_size):
+                written += db.executemany(
+                    """
+                    INSERT INTO news (external_id, title, title_folded, date, summary, author)
+                    VALUES (:external_id, :title, :title_folded, :date, :summary, :author)
+                    ON CONFLICT (external_id) DO UPDATE SET
+                        title = excluded.title,
+                        title_folded = excluded.title_folded,
+                        date = excluded.date,
+                        summary = excluded.summary,
+                        author = excluded.author,
+                        version = news.version + 1
+                    WHERE news.title IS NOT excluded.title
+                        OR news.date IS NOT excluded.date
+                        OR news.summary IS NOT excluded.summary
+                        OR news.author IS NOT excluded.author
+                    """,
+                    chunk,
+                ).rowcount
+                processed += len(chunk)
+                pending += len(chunk)
+                if pending >= commit_every:
+                    db.commit()
+                    pending = 0
+                    elapsed = time.perf_counter() - started
+                    click.echo(f"{processed} rows, {processed / elapsed:.0f} rows/s", err=True)
+            db.commit()
+        finally:
+            db.rollback()
+            if deferred:
+                rebuild_started = time.perf_counter()
+                for row in deferred:
+                    db.execute(row["sql"])
+                db.execute("DELETE FROM search_index WHERE rowid > 0")
+                db.execute(
+                    "INSERT INTO search_index (rowid, kind, ref, section, title, body)"
+                    " SELECT id, 'news', id, 'Новости', title, summary FROM news"
+                )
+                # The counter triggers were dropped too; one bump tells every
+                # worker that its news caches are stale.
+                db.execute(
+                    "UPDATE change_counters SET version = version + 1,"
+                    " changed_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now') WHERE name = 'news'"
+                )
+                db.commit()
+                click.echo(
+                    f"Rebuilt {len(deferred)} indexes and triggers and the search index"
+                    f" in {time.perf_counter() - rebuild_started:.1f}s.",
+                    err=True,
+                )
+            for name, value in saved_pragmas.items():
+                db.execute(f"PRAGMA {name} = {value}")
+        elapsed = time.perf_counter() - started
+        print(
+            f"Imported {processed} news: {written} written, {processed - written} unchanged,"
+            f" {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.0f} rows/s)."
+        )
+
+    @app.cli.command("export-news")
+    @click.argument("destination", type=click.File("w", encoding="utf-8"), default="-")
+    @click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), default="jsonl")
+    @click.option("--batch", "batch_size", type=int, default=None, help="Rows per query.")
+    def export_news_command(destination, fmt, batch_size):
+        """Write all news to a JSON Lines or CSV file in id order.
+
+        Rows are read in primary-key ranges, so memory use stays constant
+        however large the table is.
+        """
+
+        batch_size = batch_size or app.config["IMPORT_BATCH_SIZE"]
+        db = get_db()
+        columns = ", ".join(news_export_fields)
+
+        def records():
+            last_id = 0
+            while True:
+                rows = db.execute(
+                    f"SELECT {columns} FROM news WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+                last_id = rows[-1]["id"]
+
+        count = 0
+        if fmt == "csv":
+            writer = csv.DictWriter(destination, fieldnames=news_export_fields)
+            writer.writeheader()
+            for record in records():
+                writer.writerow(record)
+                count += 1
+        else:
+            for record in records():
+                destination.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        destination.flush()
+        click.echo(f"Exported {count} news.", err=True)
+
     @app.teardown_appcontext
     def close_db(exception):
         db = g.pop("db", None)
-        if db is not None:
+        if db is None:
+            return
+        if db_pool.size > 0:
+            db_pool.release(db)
+        else:
             db.close()
 
-    def fetch_news():
-        rows = get_db().execute(
-            "SELECT id, title, date, summary, author FROM news ORDER BY date(date) DESC, id DESC"
-        ).fetchall()
-        return [dict(row) for row in rows]
+    def data_version(name: str) -> int:
+        """Return the change counter of ``name``, read once per request.
+
+        Triggers bump ``change_counters`` on every write, from any worker, so a
+        differing value means the in-process copy of that data is stale.
+        """
+
+        if "data_versions" not in g:
+            rows = get_db().execute("SELECT name, version, changed_at FROM change_counters")
+            g.data_versions = {}
+            g.data_changed_at = {}
+            for row in rows:
+                g.data_versions[row["name"]] = row["version"]
+                g.data_changed_at[row["name"]] = row["changed_at"]
+        return g.data_versions.get(name, 0)
+
+    app.jinja_env.fragment_cache = LRUCache(app.config["FRAGMENT_CACHE_SIZE"])
+    app.jinja_env.fragment_versions = lambda tags: tuple(data_version(name) for name in tags)
+
+    def data_changed_at(name: str) -> Optional[datetime]:
+        data_version(name)
+        changed_at = g.data_changed_at.get(name)
+        if changed_at is None:
+            return None
+        return datetime.strptime(changed_at, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+    def news_cache_version() -> int:
+        version = data_version("news")
+        if version != news_cache_state["version"]:
+            with news_cache_lock:
+                if version != news_cache_state["version"]:
+                    if news_cache_state["version"] is not None:
+                        news_cache_state["reloads"] += 1
+                    news_cache.clear()
+                    news_cache_state["version"] = version
+        return version
+
+    def fetch_news(
+        limit: int, before: Optional[str] = None, filters: Optional[Dict[str, str]] = None
+    ):
+        key = (news_cache_version(), "page", before, limit, tuple(sorted((filters or {}).items())))
+        page = news_cache.get(key)
+        if page is None:
+            page = load_news_page(limit, before, filters)
+            news_cache.set(key, page)
+        return page
+
+    def load_news_page(
+        limit: int, before: Optional[str] = None, filters: Optional[Dict[str, str]] = None
+    ):
+        """Return one page of news, newest first, and the cursor of the next page.
+
+        Pages are addressed by keyset cursors of the form ``<sort_date>_<id>``,
+        so every page is a single range scan over the ``news_feed`` index, or
+        over ``news_by_author`` / ``news_by_title`` when ``filters`` (see
+        ``requested_news_filters``) narrow the list.
+        """
+
+        query = "SELECT id, title, date, summary, author, sort_date, version FROM news"
+        conditions: List[str] = []
+        params: List[Any] = []
+        filters = filters or {}
+        if "author" in filters:
+            conditions.append("author = ?")
+            params.append(filters["author"])
+        if "date_from" in filters:
+            conditions.append("sort_date >= ?")
+            params.append(filters["date_from"])
+        if "date_to" in filters:
+            conditions.append("sort_date <= ?")
+            params.append(filters["date_to"])
+        if "title" in filters:
+            # A prefix range over the case-folded copy: SQLite's NOCASE and LIKE
+            # only fold ASCII, which misses Cyrillic titles.
+            prefix = filters["title"].casefold()
+            conditions.append("title_folded >= ? AND title_folded < ?")
+            params.extend((prefix, prefix + "\U0010ffff"))
+        cursor = parse_news_cursor(before)
+        if cursor:
+            conditions.append("(sort_date, id) < (?, ?)")
+            params.extend(cursor)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY sort_date DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = get_db().execute(query, params).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = f"{last['sort_date']}_{last['id']}"
+        return items, next_cursor
+
+    def requested_news_page():
+        limit = request.args.get("limit", app.config["NEWS_PAGE_SIZE"], type=int)
+        limit = min(max(limit, 1), app.config["NEWS_MAX_PAGE_SIZE"])
+        return request.args.get("before") or None, limit
+
+    def requested_news_filters() -> Dict[str, str]:
+        """Read the /manage/news filters; empty and malformed values are dropped."""
+
+        filters = {}
+        author = request.args.get("author", "").strip()
+        if author:
+            filters["author"] = author
+        for name in ("date_from", "date_to"):
+            value = request.args.get(name, "").strip()
+            if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+                filters[name] = value
+        title = request.args.get("title", "").strip()[:100]
+        if title:
+            filters["title"] = title
+        return filters
 
     def fetch_news_item(news_id: int):
+        key = (news_cache_version(), "item", news_id)
+        item = news_cache.get(key)
+        if item is None:
+            item = load_news_item(news_id)
+            news_cache.set(key, item)
+        return item
+
+    def load_news_item(news_id: int):
         row = (
             get_db()
-            .execute("SELECT id, title, date, summary, author FROM news WHERE id = ?", (news_id,))
+            .execute(
+                "SELECT id, title, date, summary, author, version FROM news WHERE id = ?",
+                (news_id,),
+            )
             .fetchone()
         )
         return dict(row) if row else None
 
-    def current_user():
-        user_email = session.get("user")
-        if user_email:
+    def article_index():
+        """Return article metadata grouped by section plus a slug index.
+
+        Only slugs, titles and excerpts are kept in memory; the store is
+        reloaded whenever the ``articles`` change counter moves, so edits made
+        by any process show up without a restart.
+        """
+
+        version = data_version("articles")
+        if version != article_store["version"]:
+            with article_store_lock:
+                if version != article_store["version"]:
+                    sections: Dict[str, List[Dict[str, str]]] = {}
+                    by_slug = {}
+                    listing = []
+                    rows = get_db().execute(
+                        "SELECT slug, section, title, excerpt FROM articles ORDER BY position, id"
+                    )
+                    for row in rows:
+                        article = dict(row)
+                        sections.setdefault(article["section"], []).append(article)
+                        by_slug[article["slug"]] = article
+                        listing.append(article)
+                    article_store.update(
+                        version=version, sections=sections, by_slug=by_slug, listing=listing
+                    )
+        return article_store
+
+    def fetch_article(slug: str):
+        """Return the article for ``slug`` with its body, loading the body lazily."""
+
+        store = article_index()
+        meta = store["by_slug"].get(slug)
+        if meta is None:
+            return None
+        key = (store["version"], slug)
+        content = article_bodies.get(key)
+        if content is None:
             row = (
                 get_db()
-                .execute("SELECT email, role FROM users WHERE email = ?", (user_email,))
+                .execute("SELECT content FROM articles WHERE slug = ?", (slug,))
                 .fetchone()
             )
-            if row:
-                return {"email": row["email"], "role": row["role"]}
-        return None
+            if row is None:
+                return None
+            content = row["content"]
+            article_bodies.set(key, content)
+        return {**meta, "content": content}
+
+    def load_suggestions(db) -> None:
+        """Rebuild the suggestion index from articles, recent news and frequent terms."""
+
+        versions = {
+            row["name"]: row["version"]
+            for row in db.execute(
+                "SELECT name, version FROM change_counters WHERE name IN ('news', 'articles')"
+            )
+        }
+        entries: Dict[Any, tuple] = {}
+        term_counts: Dict[str, int] = {}
+
+        def count_terms(text: str) -> None:
+            for word in re.findall(r"\w{4,}", SuggestionIndex.normalize(text)):
+                if not word.isdigit():
+                    term_counts[word] = term_counts.get(word, 0) + 1
+
+        for row in db.execute("SELECT slug, title, excerpt FROM articles"):
+            entries[("article", row["slug"])] = (row["title"], 3.0)
+            count_terms(f"{row['title']} {row['excerpt']}")
+        rows = db.execute(
+            "SELECT id, title, summary FROM news ORDER BY sort_date DESC, id DESC LIMIT ?",
+            (app.config["SUGGEST_NEWS_LIMIT"],),
+        )
+        for row in rows:
+            entries[("news", row["id"])] = (row["title"], 2.0)
+            count_terms(f"{row['title']} {row['summary']}")
+        common = sorted(term_counts.items(), key=lambda item: -item[1])
+        common = common[: app.config["SUGGEST_TERMS"]]
+        top = common[0][1] if common else 1
+        for term, count in common:
+            entries[("term", term)] = (term, 1.0 + count / top)
+        suggestions.replace_all(entries, versions)
+
+    def refresh_suggestions() -> None:
+        """Poll the news and articles counters and reload the suggestion index when they move.
+
+        Runs in a background thread of each serving process, so the suggest
+        endpoint itself never touches the database.
+        """
+
+        connection = db_pool.connect()
+        try:
+            while True:
+                try:
+                    current = {
+                        row["name"]: row["version"]
+                        for row in connection.execute(
+                            "SELECT name, version FROM change_counters"
+                            " WHERE name IN ('news', 'articles')"
+                        )
+                    }
+                    if any(suggestions.versions.get(name) != current[name] for name in current):
+                        load_suggestions(connection)
+                except sqlite3.Error:
+                    app.logger.exception("Failed to refresh search suggestions")
+                time.sleep(app.config["SUGGEST_REFRESH_INTERVAL"])
+        finally:
+            connection.close()
+
+    def start_suggest_refresher() -> None:
+        with suggest_refresher_lock:
+            thread = suggest_refresher["thread"]
+            if suggest_refresher["pid"] == os.getpid() and thread and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=refresh_suggestions, name="suggest-refresher", daemon=True
+            )
+            suggest_refresher.update(thread=thread, pid=os.getpid())
+            thread.start()
+
+    def record_news_write(news_id: int, title: Optional[str] = None) -> None:
+        """Apply a news write made by this process to the suggestion index."""
+
+        g.pop("data_versions", None)
+        suggestions.advance("news", data_version("news"), "news", news_id, title, 2.0)
+
+    def enqueue_job(db, task: str, payload=None, delay: float = 0.0) -> None:
+        """Queue a background job in ``db``'s open transaction; no-op when jobs are off."""
+
+        if job_queue is not None:
+            job_queue.enqueue(db, task, payload, delay)
+
+    def queue_news_followups(db, news_id: Optional[int] = None) -> None:
+        # The payload is the same for every write, so with the delay a burst of
+        # edits collapses into one pending job.
+        enqueue_job(db, "warm_pages", {"paths": list(app.config["JOBS_WARM_PATHS"])}, delay=1.0)
+        if news_id is not None:
+            part = news_id // app.config["SITEMAP_CHUNK_SIZE"]
+            path = url_for("sitemap_news_xml", part=part)
+            enqueue_job(db, "warm_pages", {"paths": [path]}, delay=1.0)
+
+    def mail_enabled() -> bool:
+        return job_queue is not None and bool(app.config["MAIL_SERVER"])
+
+    if job_queue is not None:
+
+        @job_queue.task("warm_pages")
+        def warm_pages_task(payload):
+            """Regenerate on-disk documents after a write so no visitor waits for them.
+
+            Their links come from SITE_URL, so the host the test client uses
+            does not matter.
+            """
+
+            client = app.test_client()
+            for path in payload["paths"]:
+                response = client.get(path, base_url=app.config["SITE_URL"])
+                # The document is written to FEEDS_DIR as the body is read.
+                response.get_data()
+                response.close()
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{path} returned {response.status_code}")
+
+        @job_queue.task("notify_staff")
+        def notify_staff_task(payload):
+            recipients = [
+                row["email"]
+                for row in get_db().execute(
+                    "SELECT email FROM users WHERE role IN ('admin', 'editor')"
+                )
+            ]
+            send_mail(
+                app.config["MAIL_SERVER"],
+                app.config["MAIL_PORT"],
+                app.config["MAIL_SENDER"],
+                recipients,
+                f"Новое сообщение с сайта от {payload['name']}",
+                f"{payload['name']} <{payload['email']}> пишет:\n\n{payload['message']}",
+            )
+
+        @job_queue.task("send_welcome")
+        def send_welcome_task(payload):
+            send_mail(
+                app.config["MAIL_SERVER"],
+                app.config["MAIL_PORT"],
+                app.config["MAIL_SENDER"],
+                [payload["email"]],
+                f"Добро пожаловать в {site_meta['title']}",
+                "Вы зарегистрировались на сайте. Войти можно по адресу "
+                f"{payload['login_url']}.",
+            )
+
+    def run_search(match: str, page: int):
+        per_page = app.config["SEARCH_PER_PAGE"]
+        db = get_db()
+        # Bound the work a single query may do: SQLite aborts the statement once
+        # it has executed SEARCH_MAX_VM_STEPS virtual machine instructions.
+        db.set_progress_handler(lambda: 1, app.config["SEARCH_MAX_VM_STEPS"])
+        try:
+            rows = db.execute(
+                """
+                SELECT kind, ref, section, title, body FROM search_index
+                WHERE search_index MATCH ?
+                ORDER BY bm25(search_index, 0, 0, 0, 10.0, 1.0)
+                LIMIT ? OFFSET ?
+                """,
+                (match, per_page + 1, (page - 1) * per_page),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            flash("Запрос слишком общий. Уточните его, пожалуйста.", "warning")
+            return [], False
+        finally:
+            db.set_progress_handler(None, 0)
+
+        results = []
+        for row in rows[:per_page]:
+            if row["kind"] == "article":
+                article = article_index()["by_slug"].get(row["ref"])
+                if article:
+                    results.append({"article": article, "section": row["section"]})
+            else:
+                results.append(
+                    {
+                        "news": {"id": row["ref"], "title": row["title"], "summary": row["body"]},
+                        "section": row["section"],
+                    }
+                )
+        return results, len(rows) > per_page
+
+    def current_user():
+        """Return the signed-in user, resolved at most once per request."""
+
+        if "identity" not in g:
+            g.identity = load_identity()
+        return g.identity
+
+    def load_identity():
+        email = session.get("user")
+        if not email:
+            return None
+        role = session.get("role")
+        version = session.get("auth_version")
+        # The session cookie is signed, so low-privilege roles can be trusted
+        # from it and never touch the users table unless their auth_version was
+        # bumped since sign-in; other roles are always re-checked against it.
+        if (
+            role in app.config["IDENTITY_TRUSTED_ROLES"]
+            and version is not None
+            and revoked_auth_versions().get(email, 0) == version
+        ):
+            return {"email": email, "role": role}
+        row = (
+            get_db()
+            .execute("SELECT email, role, auth_version FROM users WHERE email = ?", (email,))
+            .fetchone()
+        )
+        if not row or (version is not None and version != row["auth_version"]):
+            sign_out()
+            return None
+        session["role"] = row["role"]
+        session["auth_version"] = row["auth_version"]
+        return {"email": row["email"], "role": row["role"]}
+
+    def revoked_auth_versions() -> Dict[str, int]:
+        """Map of email to auth_version for every user whose sessions were revoked.
+
+        Reloaded only when the ``users`` change counter moves, i.e. after a
+        role or password change, so trusted sessions cost no users query.
+        """
+
+        version = data_version("users")
+        if version != revoked_state["version"]:
+            with revoked_state_lock:
+                if version != revoked_state["version"]:
+                    rows = get_db().execute(
+                        "SELECT email, auth_version FROM users WHERE auth_version > 0"
+                    )
+                    revoked_state["emails"] = {row[0]: row[1] for row in rows}
+                    revoked_state["version"] = version
+        return revoked_state["emails"]
+
+    def sign_in(email: str, role: str, auth_version: int):
+        session["user"] = email
+        session["role"] = role
+        session["auth_version"] = auth_version
+        g.pop("identity", None)
+
+    def sign_out():
+        for key in ("user", "role", "auth_version"):
+            session.pop(key, None)
+        g.pop("identity", None)
+
+    def invalidate_identity(db, email: str):
+        """Revoke existing sessions of ``email`` after a role or password change."""
+
+        db.execute("UPDATE users SET auth_version = auth_version + 1 WHERE email = ?", (email,))
+        if has_request_context() and session.get("user") == email:
+            g.pop("identity", None)
 
     def login_required(func):
         @wraps(func)
@@ -365,6 +3007,195 @@ def create_app() -> Flask:
 
         return decorator
 
+    def render_page(template_name: str, **context):
+        """Render a page, streaming it in chunks when STREAM_TEMPLATES is on."""
+
+        if not app.config["STREAM_TEMPLATES"]:
+            return render_template(template_name, **context)
+        # The session is saved before a streamed body is sent, so anything that
+        # changes it (consuming flashed messages) has to happen up front.
+        get_flashed_messages(with_categories=True)
+        current_user()
+        fragments = stream_template(template_name, **context)
+        return app.response_class(
+            rechunk(fragments, app.config["STREAM_CHUNK_SIZE"]), mimetype="text/html"
+        )
+
+    def negotiate_encoding(mimetype: str, size: Optional[int] = None) -> Optional[str]:
+        if (
+            not app.config["COMPRESSION_ENABLED"]
+            or mimetype not in app.config["COMPRESSION_MIMETYPES"]
+            or (size is not None and size < app.config["COMPRESSION_MIN_SIZE"])
+        ):
+            return None
+        if brotli is not None and request.accept_encodings["br"]:
+            return "br"
+        if request.accept_encodings["gzip"]:
+            return "gzip"
+        return None
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            not app.config["COMPRESSION_ENABLED"]
+            or response.direct_passthrough
+            or response.content_encoding
+            or response.status_code in (204, 206, 304)
+            or response.status_code < 200
+            or request.method == "HEAD"
+        ):
+            return response
+        if response.mimetype in app.config["COMPRESSION_MIMETYPES"]:
+            response.vary.add("Accept-Encoding")
+        size = None if response.is_streamed else response.calculate_content_length()
+        encoding = negotiate_encoding(response.mimetype, size)
+        if encoding is None:
+            return response
+        level = app.config["COMPRESSION_LEVEL"][encoding]
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            response.set_data(compress_body(response.get_data(), encoding, level))
+        response.content_encoding = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def cached_page(*dependencies: str):
+        """Serve a rendered page from ``page_cache`` with strong ETag/Last-Modified.
+
+        The cache key covers the route, its arguments, the navigation variant
+        of the visitor and the change counters named in ``dependencies``, so a
+        conditional GET for a cached page is answered with 304 without
+        rendering. Pages with pending flash messages bypass the cache.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                return serve_cached_page(view, dependencies, args, kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def serve_cached_page(view, dependencies, args, kwargs):
+        if not page_cache.maxsize or session.get("_flashes"):
+            return view(*args, **kwargs)
+        user = current_user()
+        key = (
+            request.endpoint,
+            tuple(sorted(request.view_args.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            (user["email"], user["role"]) if user else None,
+            tuple(data_version(name) for name in dependencies),
+        )
+        entry = page_cache.get(key)
+        if entry is None:
+            rendered = make_response(view(*args, **kwargs))
+            if rendered.status_code != 200:
+                return rendered
+            body = rendered.get_data()
+            entry = {
+                "body": body,
+                "mimetype": rendered.mimetype,
+                "etag": hashlib.sha256(body).hexdigest()[:32],
+                "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+            }
+            page_cache.set(key, entry)
+        body = entry["body"]
+        encoding = negotiate_encoding(entry["mimetype"], len(body))
+        if encoding:
+            encoded = entry.setdefault("encoded", {})
+            if encoding not in encoded:
+                encoded[encoding] = compress_body(
+                    body, encoding, app.config["COMPRESSION_LEVEL"][encoding]
+                )
+            body = encoded[encoding]
+        response = app.response_class(body, mimetype=entry["mimetype"])
+        if encoding:
+            response.content_encoding = encoding
+        if app.config["COMPRESSION_ENABLED"]:
+            response.vary.add("Accept-Encoding")
+        response.set_etag(entry["etag"], weak=bool(encoding))
+        response.last_modified = entry["last_modified"]
+        response.cache_control.no_cache = True
+        if user:
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        response.vary.add("Cookie")
+        return response.make_conditional(request)
+
+    @app.before_request
+    def limit_writes():
+        """Apply rate limits and the shared write concurrency cap to POSTs."""
+
+        if request.method != "POST":
+            return
+        limits = app.config["RATE_LIMITS"].get(request.endpoint)
+        if limits and app.config["RATE_LIMIT_ENABLED"]:
+            keys = {"ip": request.remote_addr or "-"}
+            if "account" in limits:
+                keys["account"] = request.form.get("email", "").strip().lower()
+            for kind, (capacity, per) in limits.items():
+                if not keys.get(kind):
+                    continue
+                wait = rate_limiter.hit(f"{request.endpoint}:{kind}:{keys[kind]}", capacity, per)
+                if wait:
+                    raise TooManyRequests(retry_after=math.ceil(wait))
+        if not app.config["WRITE_CONCURRENCY"]:
+            return
+        lease = rate_limiter.acquire(app.config["WRITE_CONCURRENCY"], app.config["WRITE_LEASE"])
+        with write_admission_lock:
+            if lease is None:
+                write_admission["rejected"] += 1
+                raise ServiceUnavailable(retry_after=1)
+            write_admission["active"] += 1
+        g.write_lease = lease
+
+    @app.teardown_request
+    def release_write_lease(exception):
+        lease = g.pop("write_lease", None)
+        if lease is not None:
+            rate_limiter.release(lease)
+            with write_admission_lock:
+                write_admission["active"] -= 1
+
+    @app.template_global()
+    def asset_url(filename: str) -> str:
+        """URL of the fingerprinted build of a static file, or the file itself."""
+
+        hashed = asset_manifest.get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("assets", filename=hashed)
+
+    @app.route("/assets/<path:filename>")
+    def assets(filename: str):
+        path = os.path.realpath(os.path.join(assets_dir, filename))
+        if not path.startswith(os.path.realpath(assets_dir) + os.sep) or not os.path.isfile(path):
+            abort(404)
+        mimetype = "text/css" if filename.endswith(".css") else "text/javascript"
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        # send_file hands the open file to the server's wsgi.file_wrapper, which
+        # gunicorn serves with sendfile(); USE_X_SENDFILE delegates it to nginx.
+        response = send_file(
+            path, mimetype=mimetype, max_age=app.config["ASSETS_MAX_AGE"], conditional=True
+        )
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.immutable = True
+        response.expires = time.time() + app.config["ASSETS_MAX_AGE"]
+        return response
+
     @app.context_processor
     def inject_globals():
         return {
@@ -384,44 +3215,199 @@ def create_app() -> Flask:
 
     @app.route("/")
     def index():
-        return render_template(
+        # Loaders rather than data: the template calls them only inside its
+        # {% cache %} blocks, so a cached page does not touch the news cache.
+        return render_page(
             "home.html",
             banner=banner,
-            news=fetch_news(),
-            sections=article_sections,
+            load_news=lambda: fetch_news(app.config["NEWS_HOME_LIMIT"])[0],
+            load_sections=lambda: article_index()["sections"],
         )
 
     @app.route("/about")
+    @cached_page()
     def about():
         return render_template("about.html")
 
     @app.route("/services")
+    @cached_page()
     def services():
         return render_template("services.html")
 
     @app.route("/articles")
+    @cached_page("articles")
     def articles():
-        return render_template("articles.html", sections=article_sections)
+        return render_template("articles.html", sections=article_index()["sections"])
 
     @app.route("/practices")
+    @cached_page("articles")
     def practices():
-        return render_template("practices.html", practices=article_sections.get("Практики", []))
+        practices = [
+            fetch_article(article["slug"])
+            for article in article_index()["sections"].get("Практики", [])
+        ]
+        return render_template("practices.html", practices=[item for item in practices if item])
 
     @app.route("/articles/<slug>")
+    @cached_page("articles")
     def article_detail(slug: str):
-        for group in article_sections.values():
-            for article in group:
-                if article["slug"] == slug:
-                    return render_template("article_detail.html", article=article)
-        abort(404)
+        article = fetch_article(slug)
+        if article is None:
+            abort(404)
+        return render_template("article_detail.html", article=article)
 
     @app.route("/resources")
+    @cached_page()
     def resources_page():
         return render_template("resources.html", resources=resources)
 
+    @app.route("/news/<int:news_id>")
+    @cached_page("news")
+    def news_detail(news_id: int):
+        item = fetch_news_item(news_id)
+        if item is None:
+            abort(404)
+        return render_template("news_detail.html", item=item)
+
     @app.route("/news")
     def news_page():
-        return render_template("news.html", news=fetch_news())
+        before, limit = requested_news_page()
+        items, next_cursor = fetch_news(limit, before)
+        return render_page(
+            "news.html", news=items, before=before, limit=limit, next_cursor=next_cursor
+        )
+
+    news_api_fields = ("id", "title", "date", "summary", "author")
+    article_api_fields = ("slug", "section", "title", "excerpt")
+
+    def api_error(status: int, message: str):
+        return app.response_class(
+            dump_json({"error": message}), status=status, mimetype="application/json"
+        )
+
+    def api_fields(allowed: Sequence[str]) -> List[str]:
+        fields = parse_fields(request.args.get("fields"), allowed)
+        if fields is None:
+            abort(api_error(400, f"Unknown field; allowed: {', '.join(allowed)}."))
+        return fields
+
+    def api_response(dependency: str, build: Callable[[], Any]):
+        """Return ``build()`` as JSON, validated by the ``dependency`` change counter.
+
+        ETag and Last-Modified are derived from ``change_counters`` only, so a
+        poll with a current validator is answered with 304 before the payload
+        is built or serialised. Views must raise 404 and 400 errors before
+        calling this, or a conditional request would get 304 for them.
+        """
+
+        version = data_version(dependency)
+        tag = f"{dependency}:{version}:{request.full_path}"
+        response = app.response_class(mimetype="application/json")
+        response.set_etag(hashlib.sha256(tag.encode("utf-8")).hexdigest()[:32])
+        response.last_modified = data_changed_at(dependency)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config["API_MAX_AGE"]
+        response.cache_control.s_maxage = app.config["API_SHARED_MAX_AGE"]
+        response.cache_control.stale_while_revalidate = app.config["API_STALE_WHILE_REVALIDATE"]
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+        response.set_data(dump_json(build()))
+        return response
+
+    @app.route("/api/v1/news")
+    def api_news():
+        fields = api_fields(news_api_fields)
+        before, limit = requested_news_page()
+        if before and parse_news_cursor(before) is None:
+            abort(api_error(400, "Malformed cursor."))
+
+        def build():
+            items, next_cursor = fetch_news(limit, before)
+            return {
+                "items": [{name: item[name] for name in fields} for item in items],
+                "next_cursor": next_cursor,
+                "next": next_cursor
+                and url_for(
+                    "api_news",
+                    before=next_cursor,
+                    limit=limit,
+                    fields=request.args.get("fields"),
+                ),
+            }
+
+        return api_response("news", build)
+
+    @app.route("/api/v1/news/<int:news_id>")
+    def api_news_item(news_id: int):
+        fields = api_fields(news_api_fields)
+        # Checked before api_response, which answers a matching If-None-Match
+        # with 304 without calling build().
+        item = fetch_news_item(news_id)
+        if item is None:
+            abort(api_error(404, "News item not found."))
+
+        def build():
+            return {name: item[name] for name in fields}
+
+        return api_response("news", build)
+
+    @app.route("/api/v1/articles")
+    def api_articles():
+        fields = api_fields(article_api_fields)
+        after, limit = request.args.get("after") or None, requested_news_page()[1]
+
+        listing = article_index()["listing"]
+        start = 0
+        if after:
+            slugs = [article["slug"] for article in listing]
+            if after not in slugs:
+                abort(api_error(400, "Unknown cursor."))
+            start = slugs.index(after) + 1
+
+        def build():
+            items = listing[start : start + limit]
+            next_cursor = items[-1]["slug"] if start + limit < len(listing) else None
+            return {
+                "items": [{name: article[name] for name in fields} for article in items],
+                "next_cursor": next_cursor,
+                "next": next_cursor
+                and url_for(
+                    "api_articles",
+                    after=next_cursor,
+                    limit=limit,
+                    fields=request.args.get("fields"),
+                ),
+            }
+
+        return api_response("articles", build)
+
+    @app.route("/api/v1/articles/<slug>")
+    def api_article(slug: str):
+        fields = api_fields(article_api_fields + ("content",))
+        article = fetch_article(slug)
+        if article is None:
+            abort(api_error(404, "Article not found."))
+
+        def build():
+            return {name: article[name] for name in fields}
+
+        return api_response("articles", build)
+
+    def render_manage_news(**context):
+        before, limit = requested_news_page()
+        filters = requested_news_filters()
+        items, next_cursor = fetch_news(limit, before, filters)
+        return render_page(
+            "manage_news.html",
+            news_items=items,
+            before=before,
+            limit=limit,
+            next_cursor=next_cursor,
+            filters=filters,
+            **context,
+        )
 
     @app.route("/manage/news", methods=["GET", "POST"])
     @roles_required("admin", "editor")
@@ -434,14 +3420,17 @@ def create_app() -> Flask:
                 flash("Заполните все поля для публикации новости.", "danger")
             else:
                 db = get_db()
-                db.execute(
-                    "INSERT INTO news (title, date, summary, author) VALUES (?, ?, ?, ?)",
-                    (title, date, summary, current_user()["email"]),
-                )
+                news_id = db.execute(
+                    "INSERT INTO news (title, title_folded, date, summary, author)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (title, title.casefold(), date, summary, current_user()["email"]),
+                ).lastrowid
+                queue_news_followups(db, news_id)
                 db.commit()
+                record_news_write(news_id, title)
                 flash("Новость добавлена.", "success")
                 return redirect(url_for("manage_news"))
-        return render_template("manage_news.html", news_items=fetch_news())
+        return render_manage_news()
 
     @app.route("/manage/news/<int:news_id>/edit", methods=["GET", "POST"])
     @roles_required("admin", "editor")
@@ -456,48 +3445,214 @@ def create_app() -> Flask:
             title = request.form.get("title", "").strip()
             date = request.form.get("date", "").strip()
             summary = request.form.get("summary", "").strip()
-            if not (title and date and summary):
+            version = request.form.get("version", type=int)
+            if not (title and date and summary) or version is None:
                 flash("Все поля обязательны для обновления.", "danger")
             else:
                 db = get_db()
-                db.execute(
-                    "UPDATE news SET title = ?, date = ?, summary = ? WHERE id = ?",
-                    (title, date, summary, news_id),
-                )
+                # Optimistic concurrency: the update only applies to the version
+                # the editor loaded, so a concurrent save is detected, not lost.
+                updated = db.execute(
+                    "UPDATE news SET title = ?, title_folded = ?, date = ?, summary = ?,"
+                    " version = version + 1 WHERE id = ? AND version = ?",
+                    (title, title.casefold(), date, summary, news_id, version),
+                ).rowcount
+                if updated:
+                    queue_news_followups(db, news_id)
                 db.commit()
-                flash("Новость обновлена.", "success")
-                return redirect(url_for("manage_news"))
-        return render_template(
-            "manage_news.html", news_items=fetch_news(), active_item=fetch_news_item(news_id)
-        )
+                if updated:
+                    record_news_write(news_id, title)
+                    flash("Новость обновлена.", "success")
+                    return redirect(url_for("manage_news"))
+                current = load_news_item(news_id)
+                if current is None:
+                    flash("Новость удалена другим редактором.", "warning")
+                    return redirect(url_for("manage_news"))
+                flash(
+                    "Новость уже изменил другой редактор. Сверьте текст с сохранённой версией"
+                    " и сохраните ещё раз.",
+                    "warning",
+                )
+                # Keep the editor's text but target the version now stored.
+                return render_manage_news(
+                    active_item={**current, "title": title, "date": date, "summary": summary},
+                    saved_item=current,
+                )
+        return render_manage_news(active_item=item)
 
     @app.route("/manage/news/<int:news_id>/delete", methods=["POST"])
     @roles_required("admin")
     def delete_news(news_id: int):
         db = get_db()
         deleted = db.execute("DELETE FROM news WHERE id = ?", (news_id,)).rowcount
+        if deleted:
+            queue_news_followups(db)
         db.commit()
         if deleted:
+            record_news_write(news_id)
             flash("Новость удалена.", "info")
         else:
             flash("Новость не найдена.", "warning")
         return redirect(url_for("manage_news"))
 
+    def cache_statistics():
+        return {
+            "news": {
+                "hits": news_cache.hits,
+                "misses": news_cache.misses,
+                "reloads": news_cache_state["reloads"],
+                "entries": len(news_cache),
+                "version": news_cache_state["version"],
+            },
+            "pages": {
+                "hits": page_cache.hits,
+                "misses": page_cache.misses,
+                "entries": len(page_cache),
+            },
+            "fragments": {
+                "hits": app.jinja_env.fragment_cache.hits,
+                "misses": app.jinja_env.fragment_cache.misses,
+                "entries": len(app.jinja_env.fragment_cache),
+            },
+            "suggestions": {
+                "entries": len(suggestions),
+                "rebuilds": suggestions.rebuilds,
+                "updates": suggestions.updates,
+            },
+            "rate_limit": {
+                "allowed": rate_limiter.allowed,
+                "rejected": rate_limiter.rejected,
+                "errors": rate_limiter.errors,
+            },
+            "write_admission": dict(write_admission),
+            "password_hasher": {
+                "pending": password_hasher.pending,
+                "completed": password_hasher.completed,
+                "rejected": password_hasher.rejected,
+            },
+            "jobs": job_queue
+            and {
+                **job_queue.depth(get_db()),
+                "active": job_queue.active,
+                "completed": job_queue.completed,
+                "retried": job_queue.retried,
+                "failed": job_queue.failed,
+                **job_queue.latency(),
+            },
+            "contact_queue": contact_writer
+            and {
+                "depth": contact_writer.depth(),
+                "accepted": contact_writer.accepted,
+                "rejected": contact_writer.rejected,
+                "written": contact_writer.written,
+            },
+        }
+
+    @app.route("/manage/cache")
+    @roles_required("admin")
+    def cache_stats():
+        return jsonify(cache_statistics())
+
+    if app.config["METRICS_ENABLED"]:
+        metrics = MetricsRegistry(app.config["METRICS_BUCKETS"])
+
+        @app.before_request
+        def start_request_timer():
+            g.request_started = time.perf_counter()
+            g.sql_count = 0
+            g.sql_time = 0.0
+            g.render_time = 0.0
+
+        def start_render_timer(sender, template, context, **extra):
+            g.render_started = time.perf_counter()
+
+        def stop_render_timer(sender, template, context, **extra):
+            started = g.pop("render_started", None)
+            if started is not None:
+                g.render_time += time.perf_counter() - started
+
+        before_render_template.connect(start_render_timer, app, weak=False)
+        template_rendered.connect(stop_render_timer, app, weak=False)
+
+        @app.after_request
+        def record_request_metrics(response):
+            started = g.get("request_started")
+            if started is None:
+                return response
+            endpoint = request.endpoint or "unmatched"
+            if response.is_streamed and not response.direct_passthrough:
+                # The body (queries and rendering included) runs after this hook
+                # and after the headers are sent, so record once it is closed.
+                # The generator keeps this request's ``g`` alive while it runs.
+                state = g._get_current_object()
+
+                def finish():
+                    metrics.observe(
+                        endpoint,
+                        time.perf_counter() - started,
+                        state.sql_count,
+                        state.sql_time,
+                        state.render_time,
+                    )
+
+                response.call_on_close(finish)
+                return response
+            total = time.perf_counter() - started
+            metrics.observe(endpoint, total, g.sql_count, g.sql_time, g.render_time)
+            if app.config["METRICS_SERVER_TIMING"]:
+                response.headers["Server-Timing"] = (
+                    f'db;dur={g.sql_time * 1000:.2f};desc="{g.sql_count} queries", '
+                    f"render;dur={g.render_time * 1000:.2f}, "
+                    f"total;dur={total * 1000:.2f}"
+                )
+            return response
+
+        @app.route("/metrics")
+        def metrics_endpoint():
+            extra = {}
+            for cache_name, values in cache_statistics().items():
+                for field, value in (values or {}).items():
+                    if isinstance(value, (int, float)):
+                        extra[f"{cache_name}_{field}"] = value
+            return app.response_class(
+                metrics.render(extra), mimetype="text/plain; version=0.0.4"
+            )
+
     @app.route("/search")
     def search():
-        query = request.args.get("q", "").strip().lower()
-        results = []
-        if query:
-            for group_name, group in article_sections.items():
-                for article in group:
-                    haystack = f"{article['title']} {article['excerpt']} {article['content']}".lower()
-                    if query in haystack:
-                        results.append({"article": article, "section": group_name})
-            for item in fetch_news():
-                haystack = f"{item['title']} {item['summary']}".lower()
-                if query in haystack:
-                    results.append({"news": item, "section": "Новости"})
-        return render_template("search.html", query=query, results=results)
+        query = request.args.get("q", "").strip()[: app.config["SEARCH_MAX_QUERY_LENGTH"]]
+        page = min(max(request.args.get("page", 1, type=int), 1), app.config["SEARCH_MAX_PAGE"])
+        results, has_next = [], False
+        match = build_match_query(query, app.config["SEARCH_MAX_TERMS"])
+        if match:
+            results, has_next = run_search(match, page)
+        return render_page(
+            "search.html", query=query, results=results, page=page, has_next=has_next
+        )
+
+    @app.route("/search/suggest")
+    def suggest():
+        query = request.args.get("q", "")[: app.config["SEARCH_MAX_QUERY_LENGTH"]]
+        if suggestions.versions["news"] is None:
+            # First call ever: build synchronously once; afterwards the
+            # background thread keeps the index fresh.
+            load_suggestions(get_db())
+        if suggest_refresher["pid"] != os.getpid():
+            start_suggest_refresher()
+        endpoints = {"article": "article_detail", "news": "news_detail", "term": "search"}
+        arguments = {"article": "slug", "news": "news_id", "term": "q"}
+        results = [
+            {
+                "text": text,
+                "kind": kind,
+                "url": url_for(endpoints[kind], **{arguments[kind]: ref}),
+            }
+            for kind, ref, text in suggestions.lookup(query, app.config["SUGGEST_LIMIT"])
+        ]
+        response = app.response_class(dump_json(results), mimetype="application/json")
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response
 
     @app.route("/contact", methods=["GET", "POST"])
     def contact():
@@ -508,28 +3663,171 @@ def create_app() -> Flask:
             if not (name and email and message_text):
                 flash("Заполните все поля, пожалуйста.", "danger")
             else:
-                db = get_db()
-                db.execute(
-                    "INSERT INTO messages (name, email, message, created) VALUES (?, ?, ?, ?)",
-                    (
-                        name,
-                        email,
-                        message_text,
-                        datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
-                    ),
+                row = (
+                    name,
+                    email,
+                    message_text,
+                    datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
                 )
-                db.commit()
+                if contact_writer is not None:
+                    if not contact_writer.submit(row, app.config["CONTACT_QUEUE_TIMEOUT"]):
+                        flash(
+                            "Сервис временно перегружен. Пожалуйста, отправьте сообщение чуть позже.",
+                            "warning",
+                        )
+                        return render_template("contact.html"), 503, {"Retry-After": "5"}
+                # A buffered message without a notification never touches the pool.
+                if contact_writer is None or mail_enabled():
+                    db = get_db()
+                    if contact_writer is None:
+                        db.execute(
+                            "INSERT INTO messages (name, email, message, created)"
+                            " VALUES (?, ?, ?, ?)",
+                            row,
+                        )
+                    if mail_enabled():
+                        enqueue_job(
+                            db,
+                            "notify_staff",
+                            {"name": name, "email": email, "message": message_text},
+                        )
+                    db.commit()
                 flash("Сообщение отправлено. Мы свяжемся с вами в течение рабочего дня.", "success")
                 return redirect(url_for("contact"))
         return render_template("contact.html")
 
+    def message_filters():
+        """Build the WHERE clause for the inbox filters in the query string."""
+
+        filters = {
+            "archived": request.args.get("archived") == "1",
+            "email": request.args.get("email", "").strip(),
+            "date_from": request.args.get("date_from", "").strip(),
+            "date_to": request.args.get("date_to", "").strip(),
+        }
+        clauses = ["archived = ?"]
+        params: List[Any] = [int(filters["archived"])]
+        if filters["email"]:
+            clauses.append("email = ? COLLATE NOCASE")
+            params.append(filters["email"])
+        for name in ("date_from", "date_to"):
+            try:
+                day = datetime.strptime(filters[name], "%Y-%m-%d")
+            except ValueError:
+                filters[name] = ""
+                continue
+            if name == "date_from":
+                clauses.append("created >= ?")
+                params.append(day.strftime("%Y-%m-%d"))
+            else:
+                clauses.append("created < ?")
+                params.append((day + timedelta(days=1)).strftime("%Y-%m-%d"))
+        return filters, " AND ".join(clauses), params
+
+    def message_order(filters) -> str:
+        """Inbox order matching the index that serves ``filters``.
+
+        With a date bound the list follows ``messages_by_day (archived,
+        created, id)``, so the bound is a range scan on that index rather than
+        a filter over every id in ``messages_inbox``.
+        """
+
+        if filters["date_from"] or filters["date_to"]:
+            return "created DESC, id DESC"
+        return "id DESC"
+
     @app.route("/messages")
     @roles_required("admin", "editor")
     def view_messages():
+        filters, where, params = message_filters()
+        order = message_order(filters)
+        before = request.args.get("before", "")
+        # Date-filtered pages use <created>_<id> cursors, the others plain ids.
+        if order == "id DESC" and before.isdigit():
+            where += " AND id < ?"
+            params.append(int(before))
+        elif order != "id DESC" and parse_news_cursor(before):
+            where += " AND (created, id) < (?, ?)"
+            params.extend(parse_news_cursor(before))
+        else:
+            before = None
+        limit = app.config["MESSAGES_PAGE_SIZE"]
         rows = get_db().execute(
-            "SELECT id, name, email, message, created FROM messages ORDER BY id DESC"
+            f"SELECT id, name, email, message, created FROM messages WHERE {where}"
+            f" ORDER BY {order} LIMIT ?",
+            (*params, limit + 1),
         ).fetchall()
-        return render_template("messages.html", messages=[dict(row) for row in rows])
+        messages = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = messages[-1]
+            next_cursor = last["id"] if order == "id DESC" else f"{last['created']}_{last['id']}"
+        return render_page(
+            "messages.html",
+            messages=messages,
+            filters=filters,
+            before=before,
+            next_cursor=next_cursor,
+        )
+
+    @app.route("/messages/export.<any(csv, jsonl):fmt>")
+    @roles_required("admin", "editor")
+    def export_messages(fmt: str):
+        filters, where, params = message_filters()
+        order = message_order(filters).replace(" DESC", "")
+        columns = ("id", "name", "email", "message", "created")
+        cursor = get_db().execute(
+            f"SELECT {', '.join(columns)} FROM messages WHERE {where} ORDER BY {order}", params
+        )
+        chunk_size = app.config["MESSAGES_EXPORT_CHUNK"]
+
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if fmt == "csv":
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if fmt == "csv":
+                        writer.writerow(tuple(row))
+                    else:
+                        buffer.write(json.dumps(dict(row), ensure_ascii=False) + "\n")
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            yield buffer.getvalue()
+
+        mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+        return app.response_class(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=messages.{fmt}"},
+        )
+
+    @app.route("/messages/bulk", methods=["POST"])
+    @roles_required("admin", "editor")
+    def bulk_messages():
+        action = request.form.get("action")
+        ids = [int(value) for value in request.form.getlist("ids") if value.isdigit()]
+        if action == "delete" and current_user()["role"] != "admin":
+            abort(403)
+        statements = {
+            "delete": "DELETE FROM messages WHERE id = ?",
+            "archive": "UPDATE messages SET archived = 1 WHERE id = ?",
+            "restore": "UPDATE messages SET archived = 0 WHERE id = ?",
+        }
+        if action not in statements or not ids:
+            flash("Выберите сообщения и действие.", "warning")
+        else:
+            db = get_db()
+            with db:
+                changed = db.executemany(statements[action], [(i,) for i in ids]).rowcount
+            flash(f"Обработано сообщений: {changed}.", "info")
+        next_url = request.form.get("next")
+        return redirect(next_url if is_local_path(next_url) else url_for("view_messages"))
 
     @app.route("/messages/<int:message_id>/delete", methods=["POST"])
     @roles_required("admin")
@@ -545,17 +3843,35 @@ def create_app() -> Flask:
 
     @app.route("/login", methods=["GET", "POST"])
     def login():
-        next_url = request.args.get("next", url_for("index"))
+        next_url = request.args.get("next")
+        if not is_local_path(next_url):
+            next_url = url_for("index")
         if request.method == "POST":
             email = request.form.get("email", "").strip()
             password = request.form.get("password", "").strip()
-            user_record = (
-                get_db()
-                .execute("SELECT email, password, role FROM users WHERE email = ?", (email,))
-                .fetchone()
-            )
-            if user_record and user_record["password"] == password:
-                session["user"] = email
+            db = get_db()
+            user_record = db.execute(
+                "SELECT email, password, role, auth_version FROM users WHERE email = ?",
+                (email,),
+            ).fetchone()
+            method = app.config["PASSWORD_HASH_METHOD"]
+            if user_record:
+                stored = user_record["password"]
+            else:
+                stored = decoy_password_hash
+            try:
+                valid, new_hash = password_hasher.run(verify_password, stored, password, method)
+            except HasherBusy:
+                flash("Слишком много попыток входа. Повторите через несколько секунд.", "warning")
+                return render_template("login.html", next_url=next_url), 503, {"Retry-After": "5"}
+            if user_record and valid:
+                if new_hash:
+                    db.execute(
+                        "UPDATE users SET password = ? WHERE email = ? AND password = ?",
+                        (new_hash, email, stored),
+                    )
+                    db.commit()
+                sign_in(email, user_record["role"], user_record["auth_version"])
                 flash("Вход выполнен", "success")
                 return redirect(next_url)
             flash("Неверные учётные данные", "danger")
@@ -575,46 +3891,310 @@ def create_app() -> Flask:
             ):
                 flash("Пользователь с таким e-mail уже существует.", "warning")
             else:
+                try:
+                    password_hash = password_hasher.run(
+                        hash_password, password, app.config["PASSWORD_HASH_METHOD"]
+                    )
+                except HasherBusy:
+                    flash("Сервис временно перегружен. Повторите через несколько секунд.", "warning")
+                    return render_template("register.html"), 503, {"Retry-After": "5"}
                 db = get_db()
-                db.execute(
-                    "INSERT INTO users (email, password, role, created_at) VALUES (?, ?, ?, ?)",
-                    (email, password, "member", datetime.utcnow().isoformat()),
-                )
+                # Hashing takes a while, so a parallel sign-up may have won the e-mail.
+                created = db.execute(
+                    "INSERT OR IGNORE INTO users (email, password, role, created_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (email, password_hash, "member", datetime.utcnow().isoformat()),
+                ).rowcount
+                if created and mail_enabled():
+                    enqueue_job(
+                        db,
+                        "send_welcome",
+                        {"email": email, "login_url": canonical_url("login")},
+                    )
                 db.commit()
-                session["user"] = email
-                flash("Регистрация успешна. У вас роль 'member'.", "success")
-                return redirect(url_for("index"))
+                if created:
+                    sign_in(email, "member", 0)
+                    flash("Регистрация успешна. У вас роль 'member'.", "success")
+                    return redirect(url_for("index"))
+                flash("Пользователь с таким e-mail уже существует.", "warning")
         return render_template("register.html")
 
     @app.route("/logout")
     def logout():
-        session.pop("user", None)
+        sign_out()
         flash("Вы вышли из аккаунта.", "info")
         return redirect(url_for("index"))
 
+    sitemap_pages = [
+        ("Главная", "index"),
+        ("О проекте", "about"),
+        ("Решения", "services"),
+        ("Статьи", "articles"),
+        ("Практики", "practices"),
+        ("Ресурсы", "resources_page"),
+        ("Новости", "news_page"),
+        ("Контакты", "contact"),
+        ("Поиск", "search"),
+        ("Вход", "login"),
+        ("Регистрация", "register"),
+    ]
+
     @app.route("/sitemap")
+    @cached_page()
     def sitemap():
-        pages = [
-            ("Главная", url_for("index")),
-            ("О проекте", url_for("about")),
-            ("Решения", url_for("services")),
-            ("Статьи", url_for("articles")),
-            ("Практики", url_for("practices")),
-            ("Ресурсы", url_for("resources_page")),
-            ("Новости", url_for("news_page")),
-            ("Контакты", url_for("contact")),
-            ("Поиск", url_for("search")),
-            ("Вход", url_for("login")),
-            ("Регистрация", url_for("register")),
-        ]
+        pages = [(label, url_for(endpoint)) for label, endpoint in sitemap_pages]
         return render_template("sitemap.html", pages=pages)
 
+    def write_through(name: str, path: str, chunks):
+        """Yield ``chunks`` as bytes while saving them, plain and gzipped, to ``path``.
+
+        The files only replace the cached copy once the whole document has been
+        produced; an interrupted response leaves no partial file behind.
+        """
+
+        os.makedirs(feeds_dir, exist_ok=True)
+        suffix = f".{os.getpid()}-{threading.get_ident()}.tmp"
+        temporary = (path + suffix, path + ".gz" + suffix)
+        try:
+            with open(temporary[0], "wb") as plain, gzip.open(
+                temporary[1], "wb", compresslevel=app.config["COMPRESSION_LEVEL"]["gzip"]
+            ) as packed:
+                for chunk in rechunk(chunks, app.config["STREAM_CHUNK_SIZE"]):
+                    plain.write(chunk)
+                    packed.write(chunk)
+                    yield chunk
+            os.replace(temporary[1], path + ".gz")
+            os.replace(temporary[0], path)
+        finally:
+            for leftover in temporary:
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        for stale in glob.glob(os.path.join(feeds_dir, glob.escape(name) + ".*")):
+            if not stale.startswith(path) and not stale.endswith(".tmp"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def canonical_url(endpoint: str, **values) -> str:
+        """Absolute URL of ``endpoint`` under ``SITE_URL``, whatever Host was requested."""
+
+        return app.config["SITE_URL"].rstrip("/") + url_for(endpoint, **values)
+
+    def serve_generated(name: str, dependencies: Sequence[str], mimetype: str, generate):
+        """Serve a generated XML document from ``FEEDS_DIR``, streaming it on a miss.
+
+        The cached file and its ETag are keyed by the change counters in
+        ``dependencies``: after a write the first request, in any worker,
+        regenerates the document while streaming it, and every later request
+        is served from disk or answered with 304.
+        """
+
+        versions = ",".join(f"{counter}={data_version(counter)}" for counter in dependencies)
+        key = f"{app.config['SITE_URL']}|{name}|{versions}"
+        etag = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        changed = [data_changed_at(counter) for counter in dependencies]
+        path = os.path.join(feeds_dir, f"{name}.{etag}")
+        encoding = None
+        try:
+            if request.accept_encodings["gzip"] and os.path.exists(path + ".gz"):
+                handle, encoding = open(path + ".gz", "rb"), "gzip"
+            else:
+                handle = open(path, "rb")
+        except FileNotFoundError:
+            encoding = None
+            response = app.response_class(
+                stream_with_context(write_through(name, path, generate())), mimetype=mimetype
+            )
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config["FEED_MAX_AGE"]
+        else:
+            response = send_file(
+                handle,
+                mimetype=mimetype,
+                max_age=app.config["FEED_MAX_AGE"],
+                conditional=False,
+                etag=False,
+            )
+            if encoding:
+                response.content_encoding = encoding
+        response.vary.add("Accept-Encoding")
+        response.set_etag(etag, weak=bool(encoding))
+        response.last_modified = max((c for c in changed if c), default=None)
+        return response.make_conditional(request)
+
+    def atom_date(value: Optional[str], fallback: datetime) -> str:
+        if value:
+            return f"{value}T00:00:00Z"
+        return fallback.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def generate_feed():
+        items, _ = fetch_news(app.config["FEED_SIZE"])
+        updated = data_changed_at("news") or datetime.now(timezone.utc)
+        feed_url = canonical_url("feed")
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="ru">\n'
+        yield f"  <title>{xml_escape(site_meta['title'])}: новости</title>\n"
+        yield f"  <subtitle>{xml_escape(site_meta['tagline'])}</subtitle>\n"
+        yield f'  <link rel="self" type="application/atom+xml" href="{xml_escape(feed_url)}"/>\n'
+        news_url = canonical_url("news_page")
+        yield f'  <link rel="alternate" href="{xml_escape(news_url)}"/>\n'
+        yield f"  <id>{xml_escape(feed_url)}</id>\n"
+        yield f"  <updated>{atom_date(None, updated)}</updated>\n"
+        for item in items:
+            link = xml_escape(canonical_url("news_detail", news_id=item["id"]))
+            yield (
+                "  <entry>\n"
+                f"    <title>{xml_escape(item['title'])}</title>\n"
+                f'    <link rel="alternate" href="{link}"/>\n'
+                f"    <id>{link}</id>\n"
+                f"    <updated>{atom_date(item['sort_date'], updated)}</updated>\n"
+                f"    <author><name>{xml_escape(item['author'])}</name></author>\n"
+                f"    <summary>{xml_escape(item['summary'])}</summary>\n"
+                "  </entry>\n"
+            )
+        yield "</feed>\n"
+
+    def news_sitemap_parts():
+        """Yield the numbers of ``SITEMAP_CHUNK_SIZE`` id ranges that contain news.
+
+        Each step is a single primary-key seek, so gaps left by deleted news do
+        not cost a scan.
+        """
+
+        chunk = app.config["SITEMAP_CHUNK_SIZE"]
+        db = get_db()
+        start = 0
+        while True:
+            row = db.execute(
+                "SELECT id FROM news WHERE id >= ? ORDER BY id LIMIT 1", (start,)
+            ).fetchone()
+            if row is None:
+                return
+            part = row["id"] // chunk
+            yield part
+            start = (part + 1) * chunk
+
+    def generate_sitemap_index():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        loc = xml_escape(canonical_url("sitemap_pages_xml"))
+        yield f"  <sitemap><loc>{loc}</loc></sitemap>\n"
+        for part in news_sitemap_parts():
+            loc = xml_escape(canonical_url("sitemap_news_xml", part=part))
+            yield f"  <sitemap><loc>{loc}</loc></sitemap>\n"
+        yield "</sitemapindex>\n"
+
+    def generate_sitemap_pages():
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        for _, endpoint in sitemap_pages:
+            yield f"  <url><loc>{xml_escape(canonical_url(endpoint))}</loc></url>\n"
+        for article in article_index()["listing"]:
+            loc = xml_escape(canonical_url("article_detail", slug=article["slug"]))
+            yield f"  <url><loc>{loc}</loc></url>\n"
+        yield "</urlset>\n"
+
+    def generate_sitemap_news(part: int):
+        chunk = app.config["SITEMAP_CHUNK_SIZE"]
+        prefix = canonical_url("news_page") + "/"
+        rows = get_db().execute(
+            "SELECT id, sort_date FROM news WHERE id >= ? AND id < ? ORDER BY id",
+            (part * chunk, (part + 1) * chunk),
+        )
+        yield '<?xml version="1.0" encoding="utf-8"?>\n'
+        yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        for row in rows:
+            lastmod = f"<lastmod>{row['sort_date']}</lastmod>" if row["sort_date"] else ""
+            yield f"  <url><loc>{xml_escape(prefix)}{row['id']}</loc>{lastmod}</url>\n"
+        yield "</urlset>\n"
+
+    @app.route("/feed.atom")
+    def feed():
+        return serve_generated("feed", ("news",), "application/atom+xml", generate_feed)
+
+    @app.route("/sitemap.xml")
+    def sitemap_xml():
+        return serve_generated(
+            "sitemap", ("news", "articles"), "application/xml", generate_sitemap_index
+        )
+
+    @app.route("/sitemap-pages.xml")
+    def sitemap_pages_xml():
+        return serve_generated(
+            "sitemap-pages", ("articles",), "application/xml", generate_sitemap_pages
+        )
+
+    @app.route("/sitemap-news-<int:part>.xml")
+    def sitemap_news_xml(part: int):
+        chunk = app.config["SITEMAP_CHUNK_SIZE"]
+        exists = get_db().execute(
+            "SELECT 1 FROM news WHERE id >= ? AND id < ? LIMIT 1",
+            (part * chunk, (part + 1) * chunk),
+        ).fetchone()
+        if exists is None:
+            abort(404)
+        return serve_generated(
+            f"sitemap-news-{part}",
+            ("news",),
+            "application/xml",
+            lambda: generate_sitemap_news(part),
+        )
+
     @app.errorhandler(404)
     def page_not_found(error):
         return render_template("404.html"), 404
 
-    with app.app_context():
+    @app.errorhandler(429)
+    @app.errorhandler(503)
+    def too_busy(error):
+        if error.code == 429:
+            message = "Вы отправляете запросы слишком часто."
+        else:
+            message = "Сервис временно перегружен."
+        retry_after = getattr(error, "retry_after", None)
+        response = make_response(
+            render_template("429.html", message=message, retry_after=retry_after), error.code
+        )
+        if retry_after:
+            response.retry_after = retry_after
+        return response
+
+    def warm_up() -> None:
+        """Compile every template and render the hot pages once.
+
+        Runs before the process serves traffic. Under ``preload_app`` that is
+        the gunicorn master, so forked and recycled workers inherit compiled
+        templates and filled page caches instead of building them on first hit.
+        """
+
+        started = time.perf_counter()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        compiled = time.perf_counter()
+        client = app.test_client()
+        for path in app.config["TEMPLATE_WARMUP_PATHS"]:
+            response = client.get(path)
+            response.close()
+            if response.status_code != 200:
+                app.logger.warning("Warm-up request to %s returned %s", path, response.status_code)
+        # Nothing opened for the warm-up should be inherited by forked workers.
+        if contact_writer is not None and contact_writer.running:
+            contact_writer.stop()
+        if job_queue is not None and job_queue.running:
+            job_queue.stop()
+        db_pool.close_all()
+        app.logger.info(
+            "Warm-up compiled templates in %.0f ms and rendered %s pages in %.0f ms",
+            (compiled - started) * 1000,
+            len(app.config["TEMPLATE_WARMUP_PATHS"]),
+            (time.perf_counter() - compiled) * 1000,
+        )
+
+    if app.config["DB_MIGRATE_ON_STARTUP"]:
         init_db()
+    if app.config["TEMPLATE_WARMUP"]:
+        warm_up()
 
     return app
 
@@ -0,0 +1,31 @@
+"""ASGI entry point for CityGreenHub.
+
+Serves the same Flask app under an ASGI server::
+
+    pip install -r requirements-asgi.txt
+    uvicorn --factory asgi:create_asgi_app --workers 2 --timeout-keep-alive 75
+
+The event loop owns the client sockets, so idle keep-alive connections and
+slow clients cost a coroutine instead of a worker thread. A request only
+enters the thread pool once its headers have arrived; the view and its
+SQLite calls then run there. The pool is as large as the connection pool
+(``DB_POOL_SIZE``), so no more requests use the database at once than there
+are pooled connections.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+from a2wsgi import WSGIMiddleware
+
+from app import create_app
+
+
+def create_asgi_app(config_overrides: Optional[Dict[str, Any]] = None) -> WSGIMiddleware:
+    app = create_app(config_overrides)
+    threads = int(os.getenv("ASGI_THREADS", "0")) or app.config["DB_POOL_SIZE"] or 8
+    # Response chunks queued per request before a slow reader blocks its thread.
+    send_queue_size = int(os.getenv("ASGI_SEND_QUEUE_SIZE", "10"))
+    return WSGIMiddleware(app, workers=threads, send_queue_size=send_queue_size)
@@ -0,0 +1,129 @@
+"""Measure cold-start time to first response with and without template warm-up.
+
+Each configuration boots a fresh gunicorn (with ``gunicorn.conf.py``, so the
+app is preloaded) over a copy of the database, waits for the socket and then
+requests every warm-up page twice::
+
+    python -m benchmarks.coldstart --runs 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import ROOT, free_port
+
+PAGES = ("/", "/news", "/about", "/services", "/articles", "/practices", "/resources", "/contact")
+
+CONFIGURATIONS = {
+    "cold": {"TEMPLATE_CACHE_DIR": None},
+    "bytecode_cache": {},
+    "bytecode_cache+warmup": {"TEMPLATE_WARMUP": True},
+}
+
+
+def fetch(port: int, path: str) -> float:
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("GET", path)
+    connection.getresponse().read()
+    connection.close()
+    return time.perf_counter() - started
+
+
+def boot(config, threads: int = 1):
+    """Start gunicorn and return the process, its port and the boot timings."""
+
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--workers",
+            "1",
+            "--threads",
+            str(threads),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "warning",
+            f"app:create_app({config!r})",
+        ],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError("gunicorn did not start within 60 seconds")
+            time.sleep(0.01)
+    first = [fetch(port, path) for path in PAGES]
+    ready = time.perf_counter() - started - sum(first[1:])
+    second = [fetch(port, path) for path in PAGES]
+    return process, ready, first, second
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    database = os.path.join(workdir, "bench.sqlite")
+    shutil.copy(args.database, database)
+    base = {
+        "DATABASE": database,
+        "RATE_LIMIT_ENABLED": False,
+        "TEMPLATE_CACHE_DIR": os.path.join(workdir, "jinja-cache"),
+        "TEMPLATE_WARMUP_PATHS": PAGES,
+    }
+    report = {}
+    try:
+        # One throwaway boot fills the shared bytecode cache, as an earlier
+        # deploy or worker would have.
+        process, *_ = boot(base)
+        process.terminate()
+        process.wait()
+        for name, overrides in CONFIGURATIONS.items():
+            runs = []
+            for _ in range(args.runs):
+                process, ready, first, second = boot({**base, **overrides})
+                process.terminate()
+                process.wait()
+                runs.append((ready, first, second))
+            report[name] = {
+                "time_to_first_response_ms": round(
+                    statistics.median(run[0] for run in runs) * 1000, 1
+                ),
+                "first_hit_total_ms": round(
+                    statistics.median(sum(run[1]) for run in runs) * 1000, 1
+                ),
+                "first_hit_max_ms": round(statistics.median(max(run[1]) for run in runs) * 1000, 1),
+                "second_hit_total_ms": round(
+                    statistics.median(sum(run[2]) for run in runs) * 1000, 1
+                ),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Measure login throughput and its effect on other routes during a login burst.
+
+Each configuration is served by a local gunicorn over a copy of the database.
+Attackers post logins with wrong passwords while a reader polls ``/news``::
+
+    python -m benchmarks.logins --duration 10 --attackers 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.run import EDITOR, ROOT, HttpTransport, percentile, start_gunicorn
+
+# The rate limiter is off so the attackers reach the password check.
+CONFIGURATIONS = {
+    "inline": {
+        "PASSWORD_POOL_WORKERS": 0,
+        "PASSWORD_POOL_MAX_PENDING": 1000,
+        "RATE_LIMIT_ENABLED": False,
+    },
+    "pool": {"RATE_LIMIT_ENABLED": False},
+}
+
+
+def run(config, workers: int, threads: int, attackers: int, duration: float):
+    process, port = start_gunicorn(config, workers=workers, threads=threads)
+    outcomes = {"ok": 0, "rejected": 0, "failed": 0}
+    reads = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def attacker():
+        transport = HttpTransport("127.0.0.1", port)
+        while not stop.is_set():
+            try:
+                status = transport.request(
+                    "POST", "/login", {"email": EDITOR[0], "password": "wrong-password"}
+                )
+            except (http.client.HTTPException, OSError):
+                status = None
+            key = {200: "ok", 503: "rejected"}.get(status, "failed")
+            with lock:
+                outcomes[key] += 1
+
+    def reader():
+        transport = HttpTransport("127.0.0.1", port)
+        while not stop.is_set():
+            started = time.perf_counter()
+            transport.request("GET", "/news")
+            reads.append(time.perf_counter() - started)
+
+    try:
+        transport = HttpTransport("127.0.0.1", port)
+        # A successful login upgrades a legacy plaintext password to a hash.
+        transport.request("POST", "/login", {"email": EDITOR[0], "password": EDITOR[1]})
+        transport = HttpTransport("127.0.0.1", port)
+        baseline = []
+        for _ in range(200):
+            started = time.perf_counter()
+            transport.request("GET", "/news")
+            baseline.append(time.perf_counter() - started)
+        pool = [threading.Thread(target=attacker) for _ in range(attackers)]
+        pool.append(threading.Thread(target=reader))
+        for thread in pool:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in pool:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "logins_per_second": round(outcomes["ok"] / duration, 1),
+        "rejected_per_second": round(outcomes["rejected"] / duration, 1),
+        "failed": outcomes["failed"],
+        "news_idle_p95_ms": round(percentile(baseline, 0.95) * 1000, 2),
+        "news_burst_p50_ms": round(percentile(reads, 0.5) * 1000, 2),
+        "news_burst_p95_ms": round(percentile(reads, 0.95) * 1000, 2),
+        "news_burst_requests": len(reads),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--attackers", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    report = {}
+    try:
+        for name, overrides in CONFIGURATIONS.items():
+            database = os.path.join(workdir, f"{name}.sqlite")
+            shutil.copy(args.database, database)
+            config = {"DATABASE": database, **overrides}
+            report[name] = run(config, args.workers, args.threads, args.attackers, args.duration)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare /news throughput with and without the SQLite connection pool.
+
+Usage::
+
+    python -m benchmarks.news_pool --requests 2000 --threads 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from app import create_app
+
+
+def run(pool_size: int, database: str, total: int, threads: int) -> float:
+    app = create_app({"DATABASE": database, "DB_POOL_SIZE": pool_size})
+    per_thread = total // threads
+
+    def worker():
+        client = app.test_client()
+        for _ in range(per_thread):
+            response = client.get("/news")
+            assert response.status_code == 200
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    try:
+        database = os.path.join(workdir, "bench.sqlite")
+        run(args.pool_size, database, args.threads, args.threads)
+        before = run(0, database, args.requests, args.threads)
+        after = run(args.pool_size, database, args.requests, args.threads)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"/news connect-per-request: {before:8.1f} req/s")
+    print(f"/news pooled (size={args.pool_size}):  {after:8.1f} req/s")
+    print(f"speed-up: x{after / before:.2f}")
+
+
+if __name__ == "__main__":
+    main()
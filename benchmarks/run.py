@@ -0,0 +1,556 @@
+"""Drive every route of the site and report latency percentiles as JSON.
+
+Usage::
+
+    flask --app app seed-bench --news 100000 --messages 1000000 --users 100000
+    python -m benchmarks.run --mode client --requests 200 --output results.json
+    python -m benchmarks.run --mode gunicorn --workers 4 --threads 4 \\
+        --baseline benchmarks/baseline.json
+
+``--database`` points at the SQLite file to benchmark (the instance database
+by default); seed it first with ``flask seed-bench``. The run works on a
+temporary copy, since the write scenarios edit, archive and delete rows. Results are compared with
+``--baseline`` when given; the run exits with status 1 when a scenario's p95
+latency or throughput regresses by more than ``--tolerance``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+from urllib.parse import quote, urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN = ("admin@citygreenhub.example", "adminpass")
+EDITOR = ("editor@citygreenhub.example", "editorpass")
+
+
+@dataclass
+class Scenario:
+    name: str
+    endpoint: str
+    path: Union[str, Callable[[int], str]]
+    role: Optional[str] = None
+    method: str = "GET"
+    data: Optional[Callable[[int], Dict[str, str]]] = None
+    expect: tuple = (200,)
+
+
+class ClientTransport:
+    """Issues requests through Flask's test client inside this process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, data=None) -> int:
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+
+class HttpTransport:
+    """Keep-alive HTTP/1.1 client with a minimal cookie jar."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.cookies: Dict[str, str] = {}
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+
+    def request(self, method: str, path: str, data=None) -> int:
+        headers = {}
+        body = None
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self.connection.request(method, quote(path, safe="/?=&+%"), body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            raise
+        response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, rest = header.partition("=")
+            value = rest.split(";", 1)[0]
+            if value:
+                self.cookies[name.strip()] = value
+            else:
+                self.cookies.pop(name.strip(), None)
+        return response.status
+
+
+def build_scenarios(database: str, destructive_rows: int) -> List[Scenario]:
+    """Return one scenario per route and role, preparing rows that writes consume."""
+
+    def news_version(news_id: int) -> int:
+        reader = sqlite3.connect(database)
+        try:
+            return reader.execute("SELECT version FROM news WHERE id = ?", (news_id,)).fetchone()[0]
+        finally:
+            reader.close()
+
+    connection = sqlite3.connect(database)
+    with connection:
+        newest = connection.execute(
+            "SELECT sort_date || '_' || id FROM news ORDER BY sort_date DESC, id DESC"
+            " LIMIT 1 OFFSET 20"
+        ).fetchone()
+        slug = connection.execute(
+            "SELECT slug FROM articles ORDER BY position LIMIT 1"
+        ).fetchone()[0]
+        # Rows the write scenarios edit, archive and delete, inserted with the
+        # same columns the app fills on its own write path.
+        editable = connection.execute(
+            "INSERT INTO news (title, title_folded, date, summary, author) VALUES (?, ?, ?, ?, ?)",
+            ("bench edit", "bench edit", "2000-01-01", "bench", ADMIN[0]),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO news (title, title_folded, date, summary, author) VALUES (?, ?, ?, ?, ?)",
+            [("bench delete", "bench delete", "2000-01-01", "bench", ADMIN[0])] * destructive_rows,
+        )
+        doomed_news = [
+            row[0]
+            for row in connection.execute(
+                "SELECT id FROM news WHERE title = 'bench delete' ORDER BY id DESC LIMIT ?",
+                (destructive_rows,),
+            )
+        ]
+        connection.executemany(
+            "INSERT INTO messages (name, email, message, created) VALUES (?, ?, ?, ?)",
+            [("bench", "bench@bench.example", "bench", "2000-01-01 00:00 UTC")]
+            * (2 * destructive_rows),
+        )
+        bench_messages = [
+            row[0]
+            for row in connection.execute(
+                "SELECT id FROM messages WHERE email = 'bench@bench.example'"
+                " ORDER BY id DESC LIMIT ?",
+                (2 * destructive_rows,),
+            )
+        ]
+    connection.close()
+
+    news_ids = itertools.cycle(doomed_news)
+    message_ids = itertools.cycle(bench_messages[:destructive_rows])
+    archived_ids = itertools.cycle(bench_messages[destructive_rows:])
+    cursor_arg = f"?before={newest[0]}" if newest else ""
+    api_page_arg = f"{cursor_arg}&fields=id,title" if cursor_arg else "?fields=id,title"
+
+    return [
+        Scenario("home", "index", "/"),
+        Scenario("about", "about", "/about"),
+        Scenario("services", "services", "/services"),
+        Scenario("articles", "articles", "/articles"),
+        Scenario("practices", "practices", "/practices"),
+        Scenario("article_detail", "article_detail", f"/articles/{slug}"),
+        Scenario("resources", "resources_page", "/resources"),
+        Scenario("news", "news_page", "/news"),
+        Scenario("news_page_2", "news_page", f"/news{cursor_arg}"),
+        Scenario("news_member", "news_page", "/news", role="member"),
+        Scenario("api_news", "api_news", "/api/v1/news"),
+        Scenario("api_news_page_2", "api_news", f"/api/v1/news{api_page_arg}"),
+        Scenario("api_news_item", "api_news_item", f"/api/v1/news/{editable}"),
+        Scenario("api_articles", "api_articles", "/api/v1/articles"),
+        Scenario("api_article", "api_article", f"/api/v1/articles/{slug}"),
+        Scenario("search", "search", lambda i: f"/search?q=парк+{['вода', 'шум', 'сад'][i % 3]}"),
+        Scenario("search_page_3", "search", "/search?q=город&page=3"),
+        Scenario("suggest", "suggest", lambda i: f"/search/suggest?q={['зел', 'пар', 'кры'][i % 3]}"),
+        Scenario("sitemap", "sitemap", "/sitemap"),
+        Scenario("sitemap_xml", "sitemap_xml", "/sitemap.xml"),
+        Scenario("sitemap_pages_xml", "sitemap_pages_xml", "/sitemap-pages.xml"),
+        Scenario("sitemap_news_xml", "sitemap_news_xml", "/sitemap-news-0.xml"),
+        Scenario("feed", "feed", "/feed.atom"),
+        Scenario("news_detail", "news_detail", f"/news/{editable}"),
+        Scenario("not_found", None, "/missing-page", expect=(404,)),
+        Scenario("contact_form", "contact", "/contact"),
+        Scenario(
+            "contact_submit",
+            "contact",
+            "/contact",
+            method="POST",
+            data=lambda i: {"name": "Bench", "email": "bench@bench.example", "message": f"#{i}"},
+            expect=(302,),
+        ),
+        Scenario("login_form", "login", "/login"),
+        Scenario(
+            "login_submit",
+            "login",
+            "/login",
+            method="POST",
+            data=lambda i: {"email": EDITOR[0], "password": EDITOR[1]},
+            expect=(302, 503),
+        ),
+        Scenario("register_form", "register", "/register"),
+        Scenario(
+            "register_submit",
+            "register",
+            "/register",
+            method="POST",
+            data=lambda i: {"email": f"bench-{uuid.uuid4().hex}@bench.example", "password": "x"},
+            expect=(302, 503),
+        ),
+        Scenario("logout", "logout", "/logout", expect=(302,)),
+        Scenario("manage_news", "manage_news", "/manage/news", role="editor"),
+        Scenario(
+            "manage_news_filtered",
+            "manage_news",
+            f"/manage/news?author={EDITOR[0]}&date_from=2015-01-01&title=Парк",
+            role="editor",
+        ),
+        Scenario(
+            "manage_news_create",
+            "manage_news",
+            "/manage/news",
+            role="editor",
+            method="POST",
+            data=lambda i: {"title": f"Bench {i}", "date": "2024-01-01", "summary": "bench"},
+            expect=(302,),
+        ),
+        Scenario("edit_news_form", "edit_news", f"/manage/news/{editable}/edit", role="admin"),
+        Scenario(
+            "edit_news_submit",
+            "edit_news",
+            f"/manage/news/{editable}/edit",
+            role="admin",
+            method="POST",
+            data=lambda i: {
+                "title": f"Edited {i}",
+                "date": "2024-01-02",
+                "summary": "bench",
+                "version": news_version(editable),
+            },
+            # Concurrent clients race for the same version; the loser gets the
+            # conflict form back with 200.
+            expect=(302, 200),
+        ),
+        Scenario(
+            "delete_news",
+            "delete_news",
+            lambda i: f"/manage/news/{next(news_ids)}/delete",
+            role="admin",
+            method="POST",
+            data=lambda i: {},
+            expect=(302,),
+        ),
+        Scenario("cache_stats", "cache_stats", "/manage/cache", role="admin"),
+        Scenario("messages", "view_messages", "/messages", role="editor"),
+        Scenario(
+            "messages_filtered",
+            "view_messages",
+            "/messages?email=visitor42@bench.example&date_from=2016-01-01",
+            role="editor",
+        ),
+        Scenario(
+            "messages_export",
+            "export_messages",
+            "/messages/export.jsonl?email=visitor7@bench.example",
+            role="editor",
+        ),
+        Scenario(
+            "messages_bulk_archive",
+            "bulk_messages",
+            "/messages/bulk",
+            role="editor",
+            method="POST",
+            data=lambda i: {"action": "archive", "ids": str(next(archived_ids))},
+            expect=(302,),
+        ),
+        Scenario(
+            "delete_message",
+            "delete_message",
+            lambda i: f"/messages/{next(message_ids)}/delete",
+            role="admin",
+            method="POST",
+            data=lambda i: {},
+            expect=(302,),
+        ),
+    ]
+
+
+def sign_in(transport, role: Optional[str]) -> None:
+    if role == "admin":
+        path, data = "/login", {"email": ADMIN[0], "password": ADMIN[1]}
+    elif role == "editor":
+        path, data = "/login", {"email": EDITOR[0], "password": EDITOR[1]}
+    elif role == "member":
+        email = f"bench-member-{uuid.uuid4().hex}@bench.example"
+        path, data = "/register", {"email": email, "password": "benchpass"}
+    else:
+        return
+    # The password hashing pool sheds concurrent sign-ins with 503; retry those.
+    for attempt in range(50):
+        if transport.request("POST", path, data) != 503:
+            return
+        time.sleep(0.05 * (attempt + 1))
+    raise RuntimeError(f"could not sign in as {role}")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_scenario(scenario: Scenario, make_transport, requests: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker():
+        nonlocal errors
+        transport = make_transport()
+        sign_in(transport, scenario.role)
+        local, failed = [], 0
+        while True:
+            i = next(counter)
+            if i >= requests:
+                break
+            path = scenario.path(i) if callable(scenario.path) else scenario.path
+            data = scenario.data(i) if scenario.data else None
+            started = time.perf_counter()
+            try:
+                status = transport.request(scenario.method, path, data)
+            except (OSError, http.client.HTTPException):
+                status = None
+            local.append(time.perf_counter() - started)
+            if status not in scenario.expect:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "endpoint": scenario.endpoint,
+        "role": scenario.role or "anonymous",
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def uncovered_endpoints(app, scenarios: List[Scenario]) -> List[str]:
+    covered = {scenario.endpoint for scenario in scenarios}
+    return sorted(
+        rule.endpoint
+        for rule in app.url_map.iter_rules()
+        if rule.endpoint != "static" and rule.endpoint not in covered
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(config: Dict, workers: int, threads: int):
+    port = free_port()
+    factory = f"app:create_app({config!r})"
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--log-level",
+            "warning",
+            factory,
+        ],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            HttpTransport("127.0.0.1", port).request("GET", "/about")
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30 seconds")
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps"
+            )
+    return regressions
+
+
+def parse_overrides(values: List[str]) -> Dict:
+    overrides = {}
+    for value in values:
+        key, _, raw = value.partition("=")
+        try:
+            overrides[key] = json.loads(raw)
+        except ValueError:
+            overrides[key] = raw
+    return overrides
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("client", "gunicorn"), default="client")
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--only", action="append", default=[], help="run only these scenarios")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=JSON",
+        help="app.config override, e.g. --set DB_POOL_SIZE=0",
+    )
+    parser.add_argument("--output", help="write results JSON here (stdout otherwise)")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write the results to --baseline instead of comparing",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    database = os.path.join(workdir, "bench.sqlite")
+    # The backup API copies a consistent snapshot, WAL contents included.
+    source = sqlite3.connect(f"file:{os.path.abspath(args.database)}?mode=ro", uri=True)
+    with sqlite3.connect(database) as copy:
+        source.backup(copy)
+    source.close()
+    config = {
+        "DATABASE": database,
+        "RATE_LIMIT_DATABASE": os.path.join(workdir, "ratelimit.sqlite"),
+        "FEEDS_DIR": os.path.join(workdir, "feeds"),
+        # Every scenario posts from one address; measure the views, not the limiter.
+        "RATE_LIMIT_ENABLED": False,
+        **parse_overrides(args.set),
+    }
+    app = create_app(config)
+    scenarios = build_scenarios(config["DATABASE"], args.requests)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.only]
+    missing = uncovered_endpoints(app, scenarios) if not args.only else []
+    if missing:
+        print(f"warning: no scenario for {', '.join(missing)}", file=sys.stderr)
+
+    process = None
+    if args.mode == "gunicorn":
+        process, port = start_gunicorn(config, args.workers, args.threads)
+        make_transport = lambda: HttpTransport("127.0.0.1", port)  # noqa: E731
+    else:
+        make_transport = lambda: ClientTransport(app)  # noqa: E731
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            results[scenario.name] = run_scenario(
+                scenario, make_transport, args.requests, args.concurrency
+            )
+            print(
+                f"{scenario.name:24} {results[scenario.name]['throughput_rps']:9.1f} rps"
+                f"  p50 {results[scenario.name]['p50_ms']:8.2f} ms"
+                f"  p99 {results[scenario.name]['p99_ms']:8.2f} ms",
+                file=sys.stderr,
+            )
+        with sqlite3.connect(config["DATABASE"]) as connection:
+            sizes = {
+                table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("news", "messages", "users")
+            }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        "meta": {
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers if args.mode == "gunicorn" else None,
+            "threads": args.threads if args.mode == "gunicorn" else None,
+            "config": {
+                key: value
+                for key, value in config.items()
+                if key not in ("DATABASE", "RATE_LIMIT_DATABASE", "FEEDS_DIR")
+            },
+            "dataset": sizes,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "scenarios": results,
+    }
+
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(payload + "\n")
+    else:
+        print(payload)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            handle.write(payload + "\n")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        for line in regressions:
+            print(f"regression: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
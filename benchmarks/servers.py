@@ -0,0 +1,187 @@
+"""Compare the gunicorn and ASGI servers under idle and slow connections.
+
+Each server runs over a copy of the database. The benchmark holds idle
+keep-alive connections and half-sent requests open, probes ``/news`` while
+they are held, and reports probe latency, failures and the servers' RSS::
+
+    pip install -r requirements-asgi.txt
+    python -m benchmarks.servers --idle 1000 --slow 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import ROOT, HttpTransport, free_port, percentile, start_gunicorn
+
+
+def start_uvicorn(config, workers: int, workdir: str):
+    # uvicorn imports its app by name, so the overrides go into a tiny module.
+    with open(os.path.join(workdir, "bench_asgi.py"), "w", encoding="utf-8") as handle:
+        handle.write(
+            "from asgi import create_asgi_app\n\n\n"
+            f"def factory():\n    return create_asgi_app({config!r})\n"
+        )
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "--factory",
+            "bench_asgi:factory",
+            "--app-dir",
+            workdir,
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+            "--timeout-keep-alive",
+            "75",
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            HttpTransport("127.0.0.1", port).request("GET", "/about")
+            return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+def tree_rss_mb(pid: int) -> float:
+    """Sum the resident memory of a process and all of its descendants."""
+
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", encoding="ascii") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", encoding="ascii") as handle:
+                    pending.extend(int(child) for child in handle.read().split())
+        except OSError:
+            continue
+    return round(total / 1024, 1)
+
+
+def probe(port: int, requests: int, timeout: float, max_failures: int = 5):
+    latencies, failures = [], 0
+    for _ in range(requests):
+        if failures >= max_failures:
+            break
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        started = time.perf_counter()
+        try:
+            connection.request("GET", "/news")
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+        except (http.client.HTTPException, OSError):
+            failures += 1
+        finally:
+            connection.close()
+    return latencies, failures
+
+
+def run(process, port: int, idle: int, slow: int, requests: int, timeout: float):
+    baseline, _ = probe(port, requests, timeout)
+    rss_before = tree_rss_mb(process.pid)
+    held = []
+    for _ in range(idle):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        try:
+            connection.request("GET", "/about")
+            connection.getresponse().read()
+        except (http.client.HTTPException, OSError):
+            continue
+        held.append(connection)
+    stalled = []
+    for _ in range(slow):
+        # A client that sends half of its headers and then goes quiet.
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.sendall(b"GET /news HTTP/1.1\r\nHost: bench\r\n")
+        stalled.append(sock)
+    time.sleep(1)
+    latencies, failures = probe(port, requests, timeout)
+    rss_held = tree_rss_mb(process.pid)
+    alive = 0
+    for connection in held:
+        try:
+            connection.request("GET", "/about")
+            connection.getresponse().read()
+            alive += 1
+        except (http.client.HTTPException, OSError):
+            pass
+        connection.close()
+    for sock in stalled:
+        sock.close()
+    return {
+        "idle_p50_ms": round(percentile(baseline, 0.5) * 1000, 2),
+        "held_p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        "held_p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "held_probes": len(latencies) + failures,
+        "held_failures": failures,
+        "keepalive_opened": len(held),
+        "keepalive_still_open": alive,
+        "rss_mb": rss_before,
+        "rss_mb_held": rss_held,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--idle", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=3.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    report = {}
+    try:
+        for name in ("gunicorn", "uvicorn"):
+            database = os.path.join(workdir, f"{name}.sqlite")
+            shutil.copy(args.database, database)
+            config = {"DATABASE": database, "RATE_LIMIT_ENABLED": False}
+            if name == "gunicorn":
+                process, port = start_gunicorn(config, args.workers, args.threads)
+            else:
+                # Match the thread count so both servers run as many views at once.
+                config["DB_POOL_SIZE"] = args.threads
+                process, port = start_uvicorn(config, args.workers, workdir)
+            try:
+                report[name] = run(
+                    process, port, args.idle, args.slow, args.requests, args.timeout
+                )
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
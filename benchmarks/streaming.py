@@ -0,0 +1,85 @@
+"""Measure time to first byte and bytes on the wire for large HTML pages.
+
+Each configuration is served by a local gunicorn over the given database::
+
+    flask --app app seed-bench --news 100000 --messages 100000 --users 0
+    python -m benchmarks.streaming --requests 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import time
+from urllib.parse import quote
+
+from benchmarks.run import ROOT, HttpTransport, percentile, sign_in, start_gunicorn
+
+CONFIGURATIONS = {
+    "buffered": {},
+    "streamed": {"STREAM_TEMPLATES": True},
+    "streamed+compressed": {"STREAM_TEMPLATES": True, "COMPRESSION_ENABLED": True},
+}
+
+PAGES = [
+    ("news_100", None, "/news?limit=100"),
+    ("manage_news_100", "editor", "/manage/news?limit=100"),
+    ("messages", "editor", "/messages"),
+    ("search", None, "/search?q=город"),
+]
+
+
+def measure(port: int, cookies, path: str):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Accept-Encoding": "br, gzip"}
+    if cookies:
+        headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+    started = time.perf_counter()
+    connection.request("GET", quote(path, safe="/?=&"), headers=headers)
+    response = connection.getresponse()
+    first = response.read1(1) if hasattr(response, "read1") else response.read(1)
+    ttfb = time.perf_counter() - started
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - started
+    connection.close()
+    return ttfb, total, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    report = {}
+    for name, overrides in CONFIGURATIONS.items():
+        config = {"DATABASE": os.path.abspath(args.database), **overrides}
+        process, port = start_gunicorn(config, workers=1, threads=1)
+        try:
+            sessions = {}
+            for role in ("editor",):
+                transport = HttpTransport("127.0.0.1", port)
+                sign_in(transport, role)
+                sessions[role] = transport.cookies
+            for page, role, path in PAGES:
+                samples = [
+                    measure(port, sessions.get(role), path) for _ in range(args.requests)
+                ]
+                ttfbs = [sample[0] for sample in samples]
+                totals = [sample[1] for sample in samples]
+                report.setdefault(page, {})[name] = {
+                    "ttfb_p50_ms": round(percentile(ttfbs, 0.5) * 1000, 2),
+                    "total_p50_ms": round(percentile(totals, 0.5) * 1000, 2),
+                    "bytes": int(statistics.median(sample[2] for sample in samples)),
+                }
+        finally:
+            process.terminate()
+            process.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
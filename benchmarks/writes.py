@@ -0,0 +1,98 @@
+"""Check that the write concurrency cap holds across gunicorn workers.
+
+Slow clients send the headers and part of the body of a ``/contact`` POST
+and then stall, so each keeps its write lease while its view waits for the
+rest. Once ``--cap`` of them are held, every further POST, whichever worker
+accepts it, must be answered with 503; after the slow clients finish, POSTs
+must succeed again::
+
+    python -m benchmarks.writes --workers 2 --threads 4 --cap 2
+
+Exits with status 1 when the cap is not enforced.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from typing import Tuple
+from urllib.parse import urlencode
+
+from benchmarks.run import ROOT, HttpTransport, start_gunicorn
+
+FORM = {"name": "Bench", "email": "bench@bench.example", "message": "Проверка лимита записей"}
+
+
+def stall(port: int) -> Tuple[socket.socket, bytes]:
+    """Open a POST that sends half of its body and then goes quiet."""
+
+    body = urlencode(FORM).encode("ascii")
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(
+        b"POST /contact HTTP/1.1\r\nHost: bench\r\n"
+        b"Content-Type: application/x-www-form-urlencoded\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii")
+        + body[: len(body) // 2]
+    )
+    return sock, body[len(body) // 2 :]
+
+
+def post(port: int) -> int:
+    return HttpTransport("127.0.0.1", port).request("POST", "/contact", FORM)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.path.join(ROOT, "instance", "citygreenhub.sqlite"))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--cap", type=int, default=2)
+    parser.add_argument("--probes", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="cgh-bench-")
+    database = os.path.join(workdir, "writes.sqlite")
+    shutil.copy(args.database, database)
+    config = {
+        "DATABASE": database,
+        "RATE_LIMIT_DATABASE": os.path.join(workdir, "ratelimit.sqlite"),
+        # Token buckets off, so only the concurrency cap can reject a POST.
+        "RATE_LIMIT_ENABLED": False,
+        "WRITE_CONCURRENCY": args.cap,
+        "JOBS_ENABLED": False,
+    }
+    process, port = start_gunicorn(config, args.workers, args.threads)
+    try:
+        before = post(port)
+        held = [stall(port) for _ in range(args.cap)]
+        time.sleep(1)
+        during = [post(port) for _ in range(args.probes)]
+        for sock, rest in held:
+            sock.sendall(rest)
+            sock.recv(65536)
+            sock.close()
+        after = post(port)
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = {
+        "before": before,
+        "held": args.cap,
+        "during_503": during.count(503),
+        "during_other": [status for status in during if status != 503],
+        "after": after,
+    }
+    print(json.dumps(report, indent=2))
+    ok = before in (200, 302) and not report["during_other"] and after in (200, 302)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""Gunicorn settings for CityGreenHub.
+
+The app is preloaded in the master so schema migrations and the asset build
+run once; forked workers only find ``PRAGMA user_version`` current.
+"""
+
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:" + os.getenv("PORT", "8000"))
+preload_app = True
+workers = int(os.getenv("GUNICORN_WORKERS", str(2 * (os.cpu_count() or 1) + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
@@ -139,4 +139,52 @@
             localStorage.setItem('cgh-theme', JSON.stringify(prefs));
         }
     });
+
+    const searchForm = document.querySelector('form[data-suggest-url]');
+    const searchInput = searchForm?.querySelector('input[name="q"]');
+    const suggestionList = document.getElementById('search-suggestions');
+    const suggestionCache = new Map();
+    let suggestTimer = null;
+    let shownSuggestions = [];
+
+    const showSuggestions = (items) => {
+        shownSuggestions = items;
+        suggestionList.replaceChildren(...items.map((item) => {
+            const option = document.createElement('option');
+            option.value = item.text;
+            return option;
+        }));
+    };
+
+    const fetchSuggestions = (query) => {
+        if (suggestionCache.has(query)) {
+            showSuggestions(suggestionCache.get(query));
+            return;
+        }
+        const url = `${searchForm.dataset.suggestUrl}?q=${encodeURIComponent(query)}`;
+        fetch(url, { headers: { Accept: 'application/json' } })
+            .then((response) => (response.ok ? response.json() : []))
+            .then((items) => {
+                suggestionCache.set(query, items);
+                if (searchInput.value.trim() === query) showSuggestions(items);
+            })
+            .catch(() => {});
+    };
+
+    searchInput?.addEventListener('input', (event) => {
+        const query = searchInput.value.trim();
+        // Picking a datalist option is reported as a replacement, not typing.
+        const replaced = !(event instanceof InputEvent) || event.inputType === 'insertReplacementText';
+        const picked = replaced && shownSuggestions.find((item) => item.text === searchInput.value);
+        if (picked) {
+            window.location.href = picked.url;
+            return;
+        }
+        clearTimeout(suggestTimer);
+        if (query.length < 2) {
+            showSuggestions([]);
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(query), 150);
+    });
 })();